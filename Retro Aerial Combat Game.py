@@ -1,623 +1,4370 @@
-import pygame
-import random
-import math
-import sys
-
-# Initialize Pygame
-pygame.init()
-
-# CGA Color Palette (4 colors)
-CGA_COLORS = {
-    'BLACK': (0, 0, 0),
-    'WHITE': (255, 255, 255),
-    'MAGENTA': (255, 85, 255),
-    'CYAN': (85, 255, 255)
-}
-
-# Game constants
-SCREEN_WIDTH = 640
-SCREEN_HEIGHT = 480
-FPS = 60
-
-class Particle:
-    """Visual effect particle for explosions"""
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.vx = random.uniform(-3, 3)
-        self.vy = random.uniform(-3, 3)
-        self.life = 30
-        self.color = color
-        self.size = random.randint(2, 4)
-    
-    def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.life -= 1
-        self.vy += 0.1  # Gravity effect
-    
-    def draw(self, screen):
-        if self.life > 0:
-            alpha_size = max(1, int(self.size * (self.life / 30)))
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), alpha_size)
-    
-    def is_alive(self):
-        return self.life > 0
-
-class PowerUp:
-    """Power-up collectibles"""
-    def __init__(self, x, y, power_type):
-        self.x = x
-        self.y = y
-        self.width = 12
-        self.height = 12
-        self.speed = 2
-        self.type = power_type  # 'health', 'rapid_fire', 'shield'
-        self.colors = {
-            'health': CGA_COLORS['MAGENTA'],
-            'rapid_fire': CGA_COLORS['CYAN'],
-            'shield': CGA_COLORS['WHITE']
-        }
-    
-    def update(self):
-        self.y += self.speed
-    
-    def draw(self, screen):
-        color = self.colors.get(self.type, CGA_COLORS['WHITE'])
-        # Draw rotating diamond shape
-        points = [
-            (self.x + self.width // 2, self.y),
-            (self.x + self.width, self.y + self.height // 2),
-            (self.x + self.width // 2, self.y + self.height),
-            (self.x, self.y + self.height // 2)
-        ]
-        pygame.draw.polygon(screen, color, points, 2)
-        # Inner cross
-        pygame.draw.line(screen, color, 
-                        (self.x + self.width // 2, self.y + 3), 
-                        (self.x + self.width // 2, self.y + self.height - 3), 2)
-        pygame.draw.line(screen, color, 
-                        (self.x + 3, self.y + self.height // 2), 
-                        (self.x + self.width - 3, self.y + self.height // 2), 2)
-
-class Fighter:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.width = 20
-        self.height = 16
-        self.speed = 5
-        self.bullets = []
-        self.health = 100
-        self.max_health = 100
-        self.shoot_cooldown = 0
-        self.rapid_fire_timer = 0
-        self.shield_timer = 0
-        self.invincible_timer = 0
-        
-    def move(self, dx, dy):
-        self.x += dx * self.speed
-        self.y += dy * self.speed
-        
-        # Keep fighter on screen
-        self.x = max(0, min(self.x, SCREEN_WIDTH - self.width))
-        self.y = max(0, min(self.y, SCREEN_HEIGHT - self.height))
-    
-    def shoot(self):
-        if self.shoot_cooldown <= 0:
-            # Normal shot
-            bullet = Bullet(self.x + self.width // 2 - 1, self.y, 0, -8, True)
-            self.bullets.append(bullet)
-            
-            # Rapid fire adds side shots
-            if self.rapid_fire_timer > 0:
-                left_bullet = Bullet(self.x + 2, self.y + 4, -2, -8, True)
-                right_bullet = Bullet(self.x + self.width - 4, self.y + 4, 2, -8, True)
-                self.bullets.append(left_bullet)
-                self.bullets.append(right_bullet)
-                self.shoot_cooldown = 5
-            else:
-                self.shoot_cooldown = 10
-    
-    def activate_power_up(self, power_type):
-        if power_type == 'health':
-            self.health = min(self.max_health, self.health + 30)
-        elif power_type == 'rapid_fire':
-            self.rapid_fire_timer = 300  # 5 seconds at 60 FPS
-        elif power_type == 'shield':
-            self.shield_timer = 180  # 3 seconds
-    
-    def take_damage(self, damage):
-        if self.shield_timer > 0 or self.invincible_timer > 0:
-            return False
-        self.health -= damage
-        self.invincible_timer = 30  # Brief invincibility after hit
-        return True
-    
-    def update(self):
-        # Update timers
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
-        if self.rapid_fire_timer > 0:
-            self.rapid_fire_timer -= 1
-        if self.shield_timer > 0:
-            self.shield_timer -= 1
-        if self.invincible_timer > 0:
-            self.invincible_timer -= 1
-        
-        # Update bullets
-        for bullet in self.bullets[:]:
-            bullet.update()
-            if bullet.y < -10:
-                self.bullets.remove(bullet)
-    
-    def draw(self, screen):
-        # Draw shield if active
-        if self.shield_timer > 0:
-            shield_color = CGA_COLORS['CYAN'] if (self.shield_timer // 5) % 2 == 0 else CGA_COLORS['WHITE']
-            pygame.draw.circle(screen, shield_color, 
-                             (int(self.x + self.width // 2), int(self.y + self.height // 2)), 
-                             15, 2)
-        
-        # Blink when invincible
-        if self.invincible_timer > 0 and self.invincible_timer % 4 < 2:
-            return
-        
-        # Draw fighter jet (simple CGA style)
-        # Main body
-        pygame.draw.rect(screen, CGA_COLORS['WHITE'], 
-                        (self.x + 6, self.y + 4, 8, 12))
-        # Wings
-        wing_color = CGA_COLORS['CYAN'] if self.rapid_fire_timer > 0 else CGA_COLORS['WHITE']
-        pygame.draw.rect(screen, wing_color, 
-                        (self.x, self.y + 8, 20, 4))
-        # Cockpit
-        pygame.draw.rect(screen, CGA_COLORS['MAGENTA'], 
-                        (self.x + 8, self.y, 4, 8))
-        
-        # Draw bullets
-        for bullet in self.bullets:
-            bullet.draw(screen)
-
-class Enemy:
-    def __init__(self, x, y, enemy_type='basic'):
-        self.x = x
-        self.y = y
-        self.type = enemy_type
-        
-        # Type-specific properties
-        if enemy_type == 'fast':
-            self.width = 12
-            self.height = 10
-            self.speed = 3.5
-            self.health = 1
-            self.shoot_delay = 80
-        elif enemy_type == 'tank':
-            self.width = 20
-            self.height = 16
-            self.speed = 1
-            self.health = 3
-            self.shoot_delay = 40
-        else:  # basic
-            self.width = 16
-            self.height = 12
-            self.speed = 2
-            self.health = 1
-            self.shoot_delay = 60
-        
-        self.bullets = []
-        self.shoot_timer = 0
-        self.move_timer = 0
-        self.direction = random.choice([-1, 1])
-        
-    def update(self):
-        self.y += self.speed
-        
-        # Add some horizontal movement for variety
-        self.move_timer += 1
-        if self.move_timer > 30:
-            self.x += self.direction * 1
-            if self.x <= 0 or self.x >= SCREEN_WIDTH - self.width:
-                self.direction *= -1
-        
-        # Shoot occasionally
-        self.shoot_timer += 1
-        if self.shoot_timer > self.shoot_delay:
-            if random.random() < 0.3:
-                self.shoot()
-            self.shoot_timer = 0
-        
-        # Update bullets
-        for bullet in self.bullets[:]:
-            bullet.update()
-            if bullet.y > SCREEN_HEIGHT + 10:
-                self.bullets.remove(bullet)
-    
-    def shoot(self):
-        if self.type == 'tank':
-            # Tank shoots spread pattern
-            for angle in [-0.3, 0, 0.3]:
-                dx = math.sin(angle) * 5
-                dy = 5
-                bullet = Bullet(self.x + self.width // 2, self.y + self.height, dx, dy, False)
-                self.bullets.append(bullet)
-        else:
-            bullet = Bullet(self.x + self.width // 2, self.y + self.height, 0, 6, False)
-            self.bullets.append(bullet)
-    
-    def take_damage(self):
-        self.health -= 1
-        return self.health <= 0
-    
-    def draw(self, screen):
-        # Different appearance based on type
-        if self.type == 'fast':
-            pygame.draw.polygon(screen, CGA_COLORS['CYAN'], [
-                (self.x + self.width // 2, self.y),
-                (self.x, self.y + self.height),
-                (self.x + self.width, self.y + self.height)
-            ])
-        elif self.type == 'tank':
-            pygame.draw.rect(screen, CGA_COLORS['WHITE'], 
-                           (self.x, self.y, self.width, self.height), 2)
-            pygame.draw.rect(screen, CGA_COLORS['MAGENTA'], 
-                           (self.x + 4, self.y + 4, self.width - 8, self.height - 8))
-        else:  # basic
-            pygame.draw.rect(screen, CGA_COLORS['MAGENTA'], 
-                           (self.x + 4, self.y, 8, 12))
-            pygame.draw.rect(screen, CGA_COLORS['WHITE'], 
-                           (self.x, self.y + 4, 16, 4))
-        
-        # Draw bullets
-        for bullet in self.bullets:
-            bullet.draw(screen)
-
-class Bullet:
-    def __init__(self, x, y, dx, dy, is_player):
-        self.x = x
-        self.y = y
-        self.dx = dx
-        self.dy = dy
-        self.width = 2
-        self.height = 4 if is_player else 6
-        self.is_player = is_player
-        
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
-    
-    def draw(self, screen):
-        color = CGA_COLORS['CYAN'] if self.is_player else CGA_COLORS['MAGENTA']
-        pygame.draw.rect(screen, color, 
-                        (int(self.x), int(self.y), self.width, self.height))
-
-class StarField:
-    """Scrolling star background"""
-    def __init__(self):
-        self.stars = []
-        for _ in range(50):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, SCREEN_HEIGHT)
-            speed = random.choice([1, 2, 3])
-            self.stars.append([x, y, speed])
-    
-    def update(self):
-        for star in self.stars:
-            star[1] += star[2]
-            if star[1] > SCREEN_HEIGHT:
-                star[1] = 0
-                star[0] = random.randint(0, SCREEN_WIDTH)
-    
-    def draw(self, screen):
-        for star in self.stars:
-            size = 1 if star[2] == 1 else 2
-            color = CGA_COLORS['WHITE'] if star[2] > 1 else CGA_COLORS['CYAN']
-            pygame.draw.circle(screen, color, (star[0], int(star[1])), size)
-
-class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("CGA Fighter Jet - Enhanced Edition")
-        self.clock = pygame.time.Clock()
-        
-        # Game objects
-        self.fighter = Fighter(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50)
-        self.enemies = []
-        self.power_ups = []
-        self.particles = []
-        self.starfield = StarField()
-        
-        # Game state
-        self.enemy_spawn_timer = 0
-        self.powerup_spawn_timer = 0
-        self.score = 0
-        self.wave = 1
-        self.enemies_killed_this_wave = 0
-        self.enemies_per_wave = 10
-        
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
-        
-        self.running = True
-        self.game_over = False
-        self.paused = False
-        
-        # High score
-        self.high_score = 0
-    
-    def spawn_enemy(self):
-        x = random.randint(0, SCREEN_WIDTH - 20)
-        
-        # Difficulty increases with waves
-        rand = random.random()
-        if self.wave >= 3 and rand < 0.2:
-            enemy_type = 'tank'
-        elif self.wave >= 2 and rand < 0.4:
-            enemy_type = 'fast'
-        else:
-            enemy_type = 'basic'
-        
-        enemy = Enemy(x, -20, enemy_type)
-        self.enemies.append(enemy)
-    
-    def spawn_powerup(self):
-        x = random.randint(20, SCREEN_WIDTH - 20)
-        power_type = random.choice(['health', 'rapid_fire', 'shield'])
-        powerup = PowerUp(x, -12, power_type)
-        self.power_ups.append(powerup)
-    
-    def create_explosion(self, x, y, color=CGA_COLORS['WHITE']):
-        for _ in range(15):
-            particle = Particle(x, y, color)
-            self.particles.append(particle)
-    
-    def check_collisions(self):
-        # Check fighter bullets hitting enemies
-        for bullet in self.fighter.bullets[:]:
-            bullet_rect = pygame.Rect(bullet.x, bullet.y, bullet.width, bullet.height)
-            for enemy in self.enemies[:]:
-                enemy_rect = pygame.Rect(enemy.x, enemy.y, enemy.width, enemy.height)
-                if bullet_rect.colliderect(enemy_rect):
-                    if bullet in self.fighter.bullets:
-                        self.fighter.bullets.remove(bullet)
-                    
-                    if enemy.take_damage():
-                        self.enemies.remove(enemy)
-                        self.score += 10 if enemy.type == 'basic' else (15 if enemy.type == 'fast' else 25)
-                        self.enemies_killed_this_wave += 1
-                        self.create_explosion(enemy.x + enemy.width // 2, 
-                                            enemy.y + enemy.height // 2, 
-                                            CGA_COLORS['MAGENTA'])
-                    break
-        
-        # Check enemy bullets hitting fighter
-        for enemy in self.enemies:
-            for bullet in enemy.bullets[:]:
-                bullet_rect = pygame.Rect(bullet.x, bullet.y, bullet.width, bullet.height)
-                fighter_rect = pygame.Rect(self.fighter.x, self.fighter.y, 
-                            self.fighter.width, self.fighter.height)
-                if bullet_rect.colliderect(fighter_rect):
-                    if bullet in enemy.bullets:
-                        enemy.bullets.remove(bullet)
-                    if self.fighter.take_damage(15):
-                        self.create_explosion(self.fighter.x + self.fighter.width // 2,
-                                            self.fighter.y + self.fighter.height // 2,
-                                            CGA_COLORS['CYAN'])
-                    if self.fighter.health <= 0:
-                        self.game_over = True
-        
-        # Check enemies colliding with fighter
-        fighter_rect = pygame.Rect(self.fighter.x, self.fighter.y, 
-                            self.fighter.width, self.fighter.height)
-        for enemy in self.enemies[:]:
-            enemy_rect = pygame.Rect(enemy.x, enemy.y, enemy.width, enemy.height)
-            if fighter_rect.colliderect(enemy_rect):
-                self.enemies.remove(enemy)
-                if self.fighter.take_damage(25):
-                    self.create_explosion(enemy.x + enemy.width // 2,
-                                        enemy.y + enemy.height // 2,
-                                        CGA_COLORS['MAGENTA'])
-                if self.fighter.health <= 0:
-                    self.game_over = True
-        
-        # Check power-up collection
-        for powerup in self.power_ups[:]:
-            powerup_rect = pygame.Rect(powerup.x, powerup.y, powerup.width, powerup.height)
-            if fighter_rect.colliderect(powerup_rect):
-                self.power_ups.remove(powerup)
-                self.fighter.activate_power_up(powerup.type)
-                self.score += 5
-    
-    def handle_input(self):
-        keys = pygame.key.get_pressed()
-        dx, dy = 0, 0
-        
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            dx = -1
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            dx = 1
-        if keys[pygame.K_UP] or keys[pygame.K_w]:
-            dy = -1
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]:
-            dy = 1
-        
-        self.fighter.move(dx, dy)
-        
-        if keys[pygame.K_SPACE]:
-            self.fighter.shoot()
-    
-    def update(self):
-        if self.paused or self.game_over:
-            return
-        
-        # Update starfield
-        self.starfield.update()
-        
-        # Check for wave completion
-        if self.enemies_killed_this_wave >= self.enemies_per_wave and len(self.enemies) == 0:
-            self.wave += 1
-            self.enemies_killed_this_wave = 0
-            self.enemies_per_wave += 5
-            self.score += 50  # Wave completion bonus
-        
-        # Spawn enemies (faster spawning as waves progress)
-        self.enemy_spawn_timer += 1
-        spawn_rate = max(30, 90 - (self.wave * 5))
-        if self.enemy_spawn_timer > spawn_rate and self.enemies_killed_this_wave < self.enemies_per_wave:
-            self.spawn_enemy()
-            self.enemy_spawn_timer = 0
-        
-        # Spawn power-ups occasionally
-        self.powerup_spawn_timer += 1
-        if self.powerup_spawn_timer > 600:  # Every 10 seconds
-            if random.random() < 0.5:
-                self.spawn_powerup()
-            self.powerup_spawn_timer = 0
-        
-        # Update game objects
-        self.fighter.update()
-        
-        for enemy in self.enemies[:]:
-            enemy.update()
-            if enemy.y > SCREEN_HEIGHT:
-                self.enemies.remove(enemy)
-        
-        for powerup in self.power_ups[:]:
-            powerup.update()
-            if powerup.y > SCREEN_HEIGHT:
-                self.power_ups.remove(powerup)
-        
-        for particle in self.particles[:]:
-            particle.update()
-            if not particle.is_alive():
-                self.particles.remove(particle)
-        
-        # Check collisions
-        self.check_collisions()
-        
-        # Update high score
-        if self.score > self.high_score:
-            self.high_score = self.score
-    
-    def draw(self):
-        # Fill screen with black
-        self.screen.fill(CGA_COLORS['BLACK'])
-        
-        # Draw starfield
-        self.starfield.draw(self.screen)
-        
-        if not self.game_over:
-            # Draw particles first (behind everything)
-            for particle in self.particles:
-                particle.draw(self.screen)
-            
-            # Draw game objects
-            self.fighter.draw(self.screen)
-            for enemy in self.enemies:
-                enemy.draw(self.screen)
-            for powerup in self.power_ups:
-                powerup.draw(self.screen)
-            
-            # Draw UI
-            score_text = self.small_font.render(f"SCORE: {self.score}", True, CGA_COLORS['WHITE'])
-            self.screen.blit(score_text, (10, 10))
-            
-            wave_text = self.small_font.render(f"WAVE: {self.wave}", True, CGA_COLORS['CYAN'])
-            self.screen.blit(wave_text, (10, 35))
-            
-            # Health bar
-            health_width = 100
-            health_height = 10
-            health_x = 10
-            health_y = 60
-            pygame.draw.rect(self.screen, CGA_COLORS['WHITE'], 
-                           (health_x, health_y, health_width, health_height), 1)
-            health_fill = int((self.fighter.health / self.fighter.max_health) * health_width)
-            if health_fill > 0:
-                health_color = CGA_COLORS['MAGENTA'] if self.fighter.health < 30 else CGA_COLORS['CYAN']
-                pygame.draw.rect(self.screen, health_color, 
-                               (health_x + 1, health_y + 1, health_fill - 2, health_height - 2))
-            
-            # Power-up indicators
-            if self.fighter.rapid_fire_timer > 0:
-                rapid_text = self.small_font.render("RAPID FIRE", True, CGA_COLORS['CYAN'])
-                self.screen.blit(rapid_text, (SCREEN_WIDTH - 130, 10))
-            
-            if self.fighter.shield_timer > 0:
-                shield_text = self.small_font.render("SHIELD", True, CGA_COLORS['WHITE'])
-                self.screen.blit(shield_text, (SCREEN_WIDTH - 90, 35))
-            
-            # Wave progress
-            progress = min(self.enemies_killed_this_wave, self.enemies_per_wave)
-            progress_text = self.small_font.render(f"{progress}/{self.enemies_per_wave}", True, CGA_COLORS['WHITE'])
-            self.screen.blit(progress_text, (10, 80))
-            
-            if self.paused:
-                pause_text = self.font.render("PAUSED", True, CGA_COLORS['WHITE'])
-                self.screen.blit(pause_text, (SCREEN_WIDTH//2 - pause_text.get_width()//2, SCREEN_HEIGHT//2))
-        else:
-            # Draw particles
-            for particle in self.particles:
-                particle.draw(self.screen)
-            
-            # Game Over screen
-            game_over_text = self.font.render("GAME OVER", True, CGA_COLORS['MAGENTA'])
-            final_score_text = self.font.render(f"SCORE: {self.score}", True, CGA_COLORS['WHITE'])
-            wave_text = self.small_font.render(f"Reached Wave: {self.wave}", True, CGA_COLORS['CYAN'])
-            high_score_text = self.small_font.render(f"High Score: {self.high_score}", True, CGA_COLORS['CYAN'])
-            restart_text = self.small_font.render("Press R to Restart or Q to Quit", True, CGA_COLORS['WHITE'])
-            
-            self.screen.blit(game_over_text, (SCREEN_WIDTH//2 - game_over_text.get_width()//2, SCREEN_HEIGHT//2 - 80))
-            self.screen.blit(final_score_text, (SCREEN_WIDTH//2 - final_score_text.get_width()//2, SCREEN_HEIGHT//2 - 30))
-            self.screen.blit(wave_text, (SCREEN_WIDTH//2 - wave_text.get_width()//2, SCREEN_HEIGHT//2))
-            self.screen.blit(high_score_text, (SCREEN_WIDTH//2 - high_score_text.get_width()//2, SCREEN_HEIGHT//2 + 25))
-            self.screen.blit(restart_text, (SCREEN_WIDTH//2 - restart_text.get_width()//2, SCREEN_HEIGHT//2 + 60))
-        
-        pygame.display.flip()
-    
-    def restart(self):
-        self.fighter = Fighter(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50)
-        self.enemies = []
-        self.power_ups = []
-        self.particles = []
-        self.enemy_spawn_timer = 0
-        self.powerup_spawn_timer = 0
-        self.score = 0
-        self.wave = 1
-        self.enemies_killed_this_wave = 0
-        self.enemies_per_wave = 10
-        self.game_over = False
-        self.paused = False
-    
-    def run(self):
-        while self.running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if self.game_over:
-                        if event.key == pygame.K_r:
-                            self.restart()
-                        elif event.key == pygame.K_q:
-                            self.running = False
-                    else:
-                        if event.key == pygame.K_p:
-                            self.paused = not self.paused
-                        elif event.key == pygame.K_ESCAPE:
-                            self.paused = not self.paused
-            
-            if not self.game_over and not self.paused:
-                self.handle_input()
-            
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
-        
-        pygame.quit()
-        sys.exit()
-
-if __name__ == "__main__":
-    game = Game()
-    game.run()
-
-
+import time
+
+STARTED = time.perf_counter()  # Before the heavy imports, for --startup-time
+
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import pygame
+import numpy as np
+import random
+import math
+import sys
+import itertools
+import argparse
+import struct
+import socket
+import heapq
+import threading
+import queue
+import types
+import json
+
+# Importing has no side effects: pygame modules are initialised by the
+# first Game that needs them (display for a window, font for drawing)
+IMPORTED = time.perf_counter()
+
+# CGA Color Palette (4 colors)
+CGA_COLORS = {
+    'BLACK': (0, 0, 0),
+    'WHITE': (255, 255, 255),
+    'MAGENTA': (255, 85, 255),
+    'CYAN': (85, 255, 255)
+}
+
+# Palettes for the paletted renderer, giving each CGA_COLORS entry its
+# displayed color; switching palettes recolors a frame without redrawing it
+CGA_PALETTES = {
+    'cyan_magenta': CGA_COLORS,
+    'cyan_red': {'BLACK': (0, 0, 0), 'WHITE': (255, 255, 255), 'MAGENTA': (255, 85, 85), 'CYAN': (85, 255, 255)},
+    'green_red': {'BLACK': (0, 0, 0), 'WHITE': (255, 255, 85), 'MAGENTA': (255, 85, 85), 'CYAN': (85, 255, 85)},
+    'low_intensity': {'BLACK': (0, 0, 0), 'WHITE': (170, 170, 170), 'MAGENTA': (170, 0, 170), 'CYAN': (0, 170, 170)}
+}
+DAMAGE_FLASH_COLOR = (170, 0, 0)  # Background color while the flash lasts
+PALETTE_PIXEL = 2  # Playfield pixels per paletted canvas pixel, along each axis
+DAMAGE_FLASH_FRAMES = 6
+
+# Game constants
+SCREEN_WIDTH = 640
+SCREEN_HEIGHT = 480
+FPS = 60
+
+# The simulation always steps at FPS; rendering may run faster or slower
+# and catches up with at most this many steps per rendered frame
+SIM_DT = 1.0 / FPS
+MAX_FRAME_SKIP = 5
+
+# Input bitmask read by Game.handle_input
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_FIRE = 16
+INPUT_PAUSE = 32  # Toggles pause; set for the step after P or Escape is pressed
+INPUT_RESTART = 64  # Restarts after game over; only sent over the network
+
+# Where windowed play logs events and keeps the high score
+EVENT_LOG_PATH = os.path.join(os.path.expanduser('~'), '.retro_aerial_combat.log')
+
+# Hold fire and weave across the screen
+WEAVE_SCRIPT = [INPUT_FIRE | INPUT_LEFT] * 90 + [INPUT_FIRE | INPUT_RIGHT] * 90
+
+# Dirty-rect mode falls back to a full flip past this fraction of the screen
+DIRTY_FLIP_THRESHOLD = 0.5
+
+# Bullet owner id for the player; enemy bullets carry their enemy's uid
+PLAYER_OWNER = 0
+
+class _Column:
+    """Attribute that lives in an EntityStore column while its object is stored"""
+    def __init__(self, column=None):
+        self.column = column
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+        if self.column is None:
+            self.column = name
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        store = obj.store
+        if store is None:
+            return obj.__dict__[self.name]
+        return store.columns[self.column][obj.slot].item()
+    
+    def __set__(self, obj, value):
+        store = obj.store
+        if store is None:
+            obj.__dict__[self.name] = value
+        else:
+            store.columns[self.column][obj.slot] = value
+
+def interpolate(previous, current, alpha):
+    """Blend positions between the previous and current step (alpha 1 = current)"""
+    if alpha >= 1:
+        return current
+    return previous + (current - previous) * alpha
+
+def surface_like(like, size):
+    """New Surface in like's pixel format, palette included"""
+    surface = pygame.Surface(size, 0, like)
+    if like.get_bitsize() == 8:
+        surface.set_palette(like.get_palette())
+    return surface
+
+def pixel_size(surface):
+    """Playfield pixels per pixel of surface along each axis"""
+    return SCREEN_WIDTH // surface.get_width()
+
+def shrink_rect(rect, pixel):
+    """The pixel-times smaller Rect covering rect"""
+    left = rect.x // pixel
+    top = rect.y // pixel
+    return pygame.Rect(left, top, -(-rect.right // pixel) - left, -(-rect.bottom // pixel) - top)
+
+def downsample(surface, pixel):
+    """Paletted surface shrunk pixel times over; each block keeps its highest
+    index, so any colored pixel wins over black (index 0)"""
+    width, height = surface.get_width() // pixel, surface.get_height() // pixel
+    blocks = pygame.surfarray.array2d(surface)[:width * pixel, :height * pixel]
+    small = surface_like(surface, (width, height))
+    pygame.surfarray.blit_array(small, blocks.reshape(width, pixel, height, pixel).max(axis=(1, 3)))
+    return small
+
+_fonts = {}
+
+def get_font(size):
+    """pygame's default font at size, loaded once per process"""
+    font = _fonts.get(size)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = _fonts[size] = pygame.font.Font(None, size)
+    return font
+
+def _columns_of(cls):
+    return [attr for klass in cls.__mro__ for attr in vars(klass).values()
+            if isinstance(attr, _Column)]
+
+class EntityStore:
+    """Structure-of-arrays storage for bullets and enemies
+    
+    Every entity is one slot across parallel NumPy columns (position,
+    velocity, size, owner, alive flag plus any extra columns). Removing an
+    entity only clears its alive flag; compact() later fills the holes by
+    swapping live slots in from the tail, so nothing is ever shifted.
+    Python handles (Bullet, Enemy) read and write their slot through
+    _Column attributes and are only created when something asks for them,
+    each given the shared attributes.
+    """
+    BASE_COLUMNS = {
+        'x': np.float64,
+        'y': np.float64,
+        'px': np.float64,  # Position at the previous step, for interpolation
+        'py': np.float64,
+        'dx': np.float64,
+        'dy': np.float64,
+        'width': np.int32,
+        'height': np.int32,
+        'owner': np.int32,
+        'serial': np.int64,  # Unique per spawn, a stable id for the network
+        'alive': np.bool_
+    }
+    COUNTS = struct.Struct('<III')  # Slots in use, dead slots, spawns, for dump()
+    
+    def __init__(self, handle_type, extra_columns=None, capacity=64, shared=None):
+        self.handle_type = handle_type
+        self.shared = shared or {}
+        self.dtypes = dict(self.BASE_COLUMNS)
+        self.dtypes.update(extra_columns or {})
+        self.capacity = capacity
+        self.count = 0  # Slots in use, live or dead
+        self.dead = 0
+        self.spawned = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in self.dtypes.items()}
+        self.objects = [None] * capacity
+        self.__dict__.update(self.columns)
+    
+    def __len__(self):
+        return self.count - self.dead
+    
+    def __iter__(self):
+        for slot in range(self.count):
+            if self.alive[slot]:
+                yield self.handle(slot)
+    
+    def __getitem__(self, index):
+        return list(self)[index]
+    
+    def __contains__(self, obj):
+        return obj.store is self and bool(self.alive[obj.slot])
+    
+    def _grow(self):
+        self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.zeros(self.capacity, column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.columns[name] = grown
+        self.objects.extend([None] * (self.capacity - len(self.objects)))
+        self.__dict__.update(self.columns)
+    
+    def spawn(self, x, y, dx, dy, width, height, owner=0, **extra):
+        """Add an entity without creating a Python handle; returns its slot"""
+        if self.count == self.capacity:
+            self._grow()
+        slot = self.count
+        self.x[slot] = x
+        self.y[slot] = y
+        self.px[slot] = x
+        self.py[slot] = y
+        self.dx[slot] = dx
+        self.dy[slot] = dy
+        self.width[slot] = width
+        self.height[slot] = height
+        self.owner[slot] = owner
+        self.spawned += 1
+        self.serial[slot] = self.spawned
+        self.alive[slot] = True
+        for name, value in extra.items():
+            self.columns[name][slot] = value
+        self.count += 1
+        return slot
+    
+    def append(self, obj):
+        """Move a detached handle's column attributes into a new slot"""
+        values = {column.column: obj.__dict__.pop(column.name) for column in _columns_of(type(obj))}
+        slot = self.spawn(**values)
+        obj.store = self
+        obj.slot = slot
+        self.objects[slot] = obj
+    
+    def handle(self, slot):
+        obj = self.objects[slot]
+        if obj is None:
+            obj = self.handle_type.__new__(self.handle_type)
+            obj.__dict__.update(self.shared)
+            obj.store = self
+            obj.slot = slot
+            self.objects[slot] = obj
+        return obj
+    
+    def live(self):
+        """Slot indices of every live entity"""
+        return np.flatnonzero(self.alive[:self.count])
+    
+    def kill(self, slot):
+        if self.alive[slot]:
+            self.alive[slot] = False
+            self.dead += 1
+    
+    def remove(self, obj):
+        if obj in self:
+            self.kill(obj.slot)
+    
+    def kill_mask(self, mask):
+        alive = self.alive[:self.count]
+        doomed = alive & mask
+        self.dead += int(np.count_nonzero(doomed))
+        alive[doomed] = False
+    
+    def kill_owner(self, owner):
+        self.kill_mask(self.owner[:self.count] == owner)
+    
+    def integrate(self, frames=1):
+        n = self.count
+        self.x[:n] += self.dx[:n] * frames
+        self.y[:n] += self.dy[:n] * frames
+    
+    def cull(self, min_y=None, max_y=None):
+        """Kill entities that have left the screen vertically"""
+        y = self.y[:self.count]
+        if min_y is not None:
+            self.kill_mask(y < min_y)
+        if max_y is not None:
+            self.kill_mask(y > max_y)
+    
+    def compact(self):
+        """Swap-remove every dead slot so live entities occupy [0, len)"""
+        if self.dead == 0:
+            return
+        n = self.count
+        new_count = n - self.dead
+        alive = self.alive[:n]
+        
+        # Dead handles keep their last values as plain attributes
+        columns = [(column, self.columns[column.column]) for column in _columns_of(self.handle_type)]
+        for slot in np.flatnonzero(~alive).tolist():
+            obj = self.objects[slot]
+            if obj is not None:
+                for column, values in columns:
+                    obj.__dict__[column.name] = values[slot].item()
+                obj.store = None
+                obj.slot = None
+        
+        holes = np.flatnonzero(~alive[:new_count])
+        fillers = np.flatnonzero(alive[new_count:]) + new_count
+        for column in self.columns.values():
+            column[holes] = column[fillers]
+        for hole, filler in zip(holes.tolist(), fillers.tolist()):
+            obj = self.objects[filler]
+            self.objects[hole] = obj
+            if obj is not None:
+                obj.slot = hole
+        self.objects[new_count:n] = [None] * (n - new_count)
+        self.alive[new_count:n] = False
+        self.count = new_count
+        self.dead = 0
+    
+    def clear(self):
+        self.kill_mask(np.ones(self.count, np.bool_))
+        self.compact()
+    
+    def dump(self, out):
+        """Append the slot counts and every column's slots in use to bytearray out"""
+        n = self.count
+        out += self.COUNTS.pack(n, self.dead, self.spawned)
+        for column in self.columns.values():
+            out += column[:n].data
+    
+    def load(self, data, offset=0):
+        """Replace the contents with what dump() wrote at offset in data;
+        returns the offset just past it. Handles are created afresh."""
+        n, dead, spawned = self.COUNTS.unpack_from(data, offset)
+        offset += self.COUNTS.size
+        self.count = 0
+        while self.capacity < n:
+            self._grow()
+        for column in self.columns.values():
+            column[:n] = np.frombuffer(data, column.dtype, n, offset)
+            offset += n * column.itemsize
+        self.alive[n:] = False
+        self.objects = [None] * self.capacity
+        self.count = n
+        self.dead = dead
+        self.spawned = spawned
+        return offset
+    
+    def save_positions(self):
+        n = self.count
+        self.px[:n] = self.x[:n]
+        self.py[:n] = self.y[:n]
+    
+    def positions(self, alpha=1.0):
+        """x, y arrays for every slot in use, interpolated from the previous step"""
+        n = self.count
+        return interpolate(self.px[:n], self.x[:n], alpha), interpolate(self.py[:n], self.y[:n], alpha)
+    
+    def rects(self, alpha=1.0, pixel=1):
+        """Integer (x, y, w, h) tuples of every live entity, in pixel-times larger pixels"""
+        live = self.live()
+        x, y = self.positions(alpha)
+        if pixel == 1:
+            return list(zip(x[live].astype(int).tolist(), y[live].astype(int).tolist(),
+                            self.width[live].tolist(), self.height[live].tolist()))
+        x = x[live].astype(int)
+        y = y[live].astype(int)
+        right = -(-(x + self.width[live].astype(int)) // pixel)
+        bottom = -(-(y + self.height[live].astype(int)) // pixel)
+        x //= pixel
+        y //= pixel
+        return list(zip(x.tolist(), y.tolist(), (right - x).tolist(), (bottom - y).tolist()))
+    
+    def slot_rects(self):
+        """pygame.Rect for every slot in use, indexed by slot (dead ones included)"""
+        n = self.count
+        return list(map(pygame.Rect, self.x[:n].astype(int).tolist(), self.y[:n].astype(int).tolist(),
+                        self.width[:n].tolist(), self.height[:n].tolist()))
+    
+    def sweep(self, slots):
+        """Start x, y, motion dx, dy and width, height of slots over the last step"""
+        px = self.px[slots]
+        py = self.py[slots]
+        return px, py, self.x[slots] - px, self.y[slots] - py, self.width[slots], self.height[slots]
+    
+    def int_bounds(self):
+        """x, y, w, h int arrays for every slot in use, truncated like pygame.Rect"""
+        n = self.count
+        return (self.x[:n].astype(np.int64), self.y[:n].astype(np.int64),
+                self.width[:n].astype(np.int64), self.height[:n].astype(np.int64))
+    
+    def swept_bounds(self):
+        """x, y, w, h int arrays for every slot in use covering all of its box
+        over the last step, from the start position to the current one"""
+        n = self.count
+        px, py, x, y = self.px[:n], self.py[:n], self.x[:n], self.y[:n]
+        left = np.floor(np.minimum(px, x))
+        top = np.floor(np.minimum(py, y))
+        right = np.ceil(np.maximum(px, x) + self.width[:n])
+        bottom = np.ceil(np.maximum(py, y) + self.height[:n])
+        return (left.astype(np.int64), top.astype(np.int64),
+                (right - left).astype(np.int64), (bottom - top).astype(np.int64))
+    
+    def fill_rects(self, screen, color, alpha=1.0):
+        return [screen.fill(color, rect) for rect in self.rects(alpha)]
+
+def rects_overlap(ax, ay, aw, ah, bx, by, bw, bh):
+    """Vectorized pygame.Rect.colliderect on int arrays of positive sizes"""
+    return (ax < bx + bw) & (bx < ax + aw) & (ay < by + bh) & (by < ay + ah)
+
+def swept_toi(ax, ay, adx, ady, aw, ah, bx, by, bdx, bdy, bw, bh):
+    """Vectorized earliest time of impact of two boxes moving over a step
+    
+    Box a starts at (ax, ay) and moves by (adx, ady), b likewise. Returns the
+    fraction of the step in [0, 1) at which they first overlap (0 if they
+    already do at its start), or inf if they don't overlap during it.
+    """
+    enter = 0.0
+    leave = 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for a, da, size_a, b, db, size_b in ((ax, adx, aw, bx, bdx, bw), (ay, ady, ah, by, bdy, bh)):
+            # On this axis they overlap while lo < d * t < hi, d being the
+            # motion of a relative to b
+            d = np.asarray(da - db, np.float64)
+            lo = b - (a + size_a)
+            hi = b + size_b - a
+            inside = (lo < 0) & (hi > 0)
+            near = np.where(d > 0, lo / d, np.where(d < 0, hi / d, np.where(inside, -np.inf, np.inf)))
+            far = np.where(d > 0, hi / d, np.where(d < 0, lo / d, np.where(inside, np.inf, -np.inf)))
+            enter = np.maximum(enter, near)
+            leave = np.minimum(leave, far)
+    return np.where(enter < leave, enter, np.inf)
+
+class SpatialHash:
+    """Uniform grid broadphase over integer rectangles
+    
+    build() hashes every rectangle into each cell it touches; query() returns
+    the (query, item) index pairs that share at least one cell, sorted by
+    query then item so callers can resolve hits in brute-force order.
+    """
+    OFFSET = 1 << 12  # Keeps keys positive for off-screen cells
+    STRIDE = 1 << 14
+    
+    def __init__(self, cell_shift=5):
+        self.cell_shift = cell_shift  # Cells are 2**cell_shift pixels square
+        self.keys = np.empty(0, np.int64)
+        self.ids = np.empty(0, np.int64)
+        self._offset_cache = {}
+    
+    def _offsets(self, span_x, span_y):
+        key = (span_x, span_y)
+        if key not in self._offset_cache:
+            self._offset_cache[key] = (np.tile(np.arange(span_x), span_y).reshape(-1, 1),
+                                       np.repeat(np.arange(span_y), span_x).reshape(-1, 1))
+        return self._offset_cache[key]
+    
+    def _cells(self, x, y, w, h, ids):
+        """Cell key and owning id for every cell each rectangle touches"""
+        if len(x) == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        shift = self.cell_shift
+        cx0 = x >> shift
+        cy0 = y >> shift
+        cx1 = (x + w - 1) >> shift
+        cy1 = (y + h - 1) >> shift
+        span_x = int((cx1 - cx0).max()) + 1
+        span_y = int((cy1 - cy0).max()) + 1
+        if span_x == 1 and span_y == 1:
+            return (cy0 + self.OFFSET) * self.STRIDE + cx0 + self.OFFSET, ids
+        
+        # One row per cell offset any rectangle needs, masked per rectangle
+        ox, oy = self._offsets(span_x, span_y)
+        cx = cx0 + ox
+        cy = cy0 + oy
+        covered = ((cx <= cx1) & (cy <= cy1)).ravel()
+        keys = ((cy + self.OFFSET) * self.STRIDE + cx + self.OFFSET).ravel()
+        return keys[covered], ids[np.newaxis].repeat(len(ox), 0).ravel()[covered]
+    
+    def build(self, x, y, w, h, ids=None):
+        if ids is None:
+            ids = np.arange(len(x))
+        else:
+            x, y, w, h = x[ids], y[ids], w[ids], h[ids]
+        keys, owners = self._cells(x, y, w, h, ids)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = owners[order]
+    
+    def query(self, x, y, w, h, ids=None):
+        if len(self.keys) == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        if ids is None:
+            ids = np.arange(len(x))
+        else:
+            x, y, w, h = x[ids], y[ids], w[ids], h[ids]
+        keys, queries = self._cells(x, y, w, h, ids)
+        start = np.searchsorted(self.keys, keys, 'left')
+        counts = np.searchsorted(self.keys, keys, 'right') - start
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        
+        # Expand each matched cell into one candidate pair per item in it
+        query_ids = np.repeat(queries, counts)
+        run_starts = np.repeat(start - np.cumsum(counts) + counts, counts)
+        item_ids = self.ids[run_starts + np.arange(total)]
+        
+        # Sort by (query, item) and drop duplicates from rectangles that
+        # share several cells
+        span = int(self.ids.max()) + 1
+        pairs = query_ids * span + item_ids
+        pairs.sort()
+        unique = np.empty(total, np.bool_)
+        unique[0] = True
+        np.not_equal(pairs[1:], pairs[:-1], out=unique[1:])
+        pairs = pairs[unique]
+        return pairs // span, pairs % span
+
+class ParticleSystem:
+    """Visual effect particles for explosions
+    
+    Particles live in a fixed-capacity ring buffer of NumPy arrays; once the
+    cap is reached each new particle overwrites the oldest one. Drawing
+    blits pre-rendered circle stamps in one Surface.blits call.
+    """
+    LIFE = 30
+    
+    def __init__(self, capacity=1024, rng=random):
+        self.capacity = capacity
+        self.rng = rng
+        self.head = 0  # Next slot to write, i.e. the oldest particle
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.px = np.zeros(capacity)
+        self.py = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.life = np.zeros(capacity, np.int32)
+        self.color = np.zeros(capacity, np.uint8)
+        self.size = np.zeros(capacity, np.int32)
+        self.palette = []
+        self.stamps = {}
+    
+    def __len__(self):
+        return int(np.count_nonzero(self.life > 0))
+    
+    def emit(self, x, y, color, count=15, keep=None):
+        """Add count particles, or only the first keep of them; the random
+        draws are the same either way so the game's generator stays in step"""
+        if color not in self.palette:
+            self.palette.append(color)
+        
+        count = min(count, self.capacity)
+        
+        # Same draws, in the same order, as one random particle at a time
+        rng = self.rng
+        values = [(rng.uniform(-3, 3), rng.uniform(-3, 3), rng.randint(2, 4))
+                  for _ in range(count)]
+        if keep is not None:
+            count = min(count, keep)
+        if count <= 0:
+            return
+        slots = (self.head + np.arange(count)) % self.capacity
+        self.head = (self.head + count) % self.capacity
+        vx, vy, size = zip(*values[:count])
+        self.x[slots] = x
+        self.y[slots] = y
+        self.px[slots] = x
+        self.py[slots] = y
+        self.vx[slots] = vx
+        self.vy[slots] = vy
+        self.size[slots] = size
+        self.life[slots] = self.LIFE
+        self.color[slots] = self.palette.index(color)
+    
+    def save_positions(self):
+        self.px[:] = self.x
+        self.py[:] = self.y
+    
+    def update(self, frames=1):
+        for _ in range(frames):
+            self.x += self.vx
+            self.y += self.vy
+            self.life -= self.life > 0
+            self.vy += 0.1  # Gravity effect
+    
+    def clear(self):
+        self.life[:] = 0
+    
+    def stamp(self, color_index, radius, like):
+        key = (color_index, radius)
+        stamp = self.stamps.get(key)
+        if stamp is None:
+            color = self.palette[color_index]
+            colorkey = CGA_COLORS['WHITE'] if color == CGA_COLORS['BLACK'] else CGA_COLORS['BLACK']
+            stamp = surface_like(like, (radius * 2 + 1, radius * 2 + 1))
+            stamp.fill(colorkey)
+            stamp.set_colorkey(colorkey)
+            if radius:
+                pygame.draw.circle(stamp, color, (radius, radius), radius)
+            else:
+                stamp.fill(color)  # Radius 1 on a canvas of 2x2 playfield pixels
+            self.stamps[key] = stamp
+        return stamp
+    
+    def snapshot(self):
+        """Copy for drawing on another thread, sharing the stamp cache"""
+        copy = ParticleSystem.__new__(ParticleSystem)
+        copy.__dict__.update(self.__dict__)
+        for name in ('x', 'y', 'px', 'py', 'life', 'color', 'size'):
+            setattr(copy, name, getattr(self, name).copy())
+        return copy
+    
+    def placed_stamps(self, like, alpha=1.0):
+        """(stamp, (left, top)) for every live particle, oldest first as created"""
+        order = np.roll(np.arange(self.capacity), -self.head)
+        order = order[self.life[order] > 0]
+        if len(order) == 0:
+            return []
+        pixel = pixel_size(like)
+        radius = np.maximum(1, (self.size[order] * (self.life[order] / self.LIFE)).astype(int)) // pixel
+        left = interpolate(self.px[order], self.x[order], alpha).astype(int) // pixel - radius
+        top = interpolate(self.py[order], self.y[order], alpha).astype(int) // pixel - radius
+        stamp = self.stamp
+        return [(stamp(c, r, like), (l, t)) for c, r, l, t in
+                zip(self.color[order].tolist(), radius.tolist(), left.tolist(), top.tolist())]
+    
+    def draw(self, screen, alpha=1.0):
+        placed = self.placed_stamps(screen, alpha)
+        return screen.blits(placed) if placed else []
+
+# Codes of the enemy and power-up types in save states and snapshots
+ENEMY_TYPES = ('basic', 'fast', 'tank')
+POWER_UP_TYPES = ('health', 'rapid_fire', 'shield')
+
+class PowerUp:
+    """Power-up collectibles"""
+    SIZE = 12
+    colors = {
+        'health': CGA_COLORS['MAGENTA'],
+        'rapid_fire': CGA_COLORS['CYAN'],
+        'shield': CGA_COLORS['WHITE']
+    }
+    next_uid = 1
+    
+    def __init__(self, x, y, power_type):
+        self.x = x
+        self.y = y
+        self.prev_y = y
+        self.width = self.SIZE
+        self.height = self.SIZE
+        self.speed = 2
+        self.type = power_type  # 'health', 'rapid_fire', 'shield'
+        self.uid = PowerUp.next_uid
+        PowerUp.next_uid += 1
+    
+    def update(self, frames=1):
+        self.y += self.speed * frames
+    
+    def sprite(self, alpha=1.0):
+        return ('power_up', self.type), self.x, interpolate(self.prev_y, self.y, alpha)
+    
+    @staticmethod
+    def paint(surface, x, y, power_type):
+        color = PowerUp.colors.get(power_type, CGA_COLORS['WHITE'])
+        size = PowerUp.SIZE
+        # Draw rotating diamond shape
+        points = [
+            (x + size // 2, y),
+            (x + size, y + size // 2),
+            (x + size // 2, y + size),
+            (x, y + size // 2)
+        ]
+        pygame.draw.polygon(surface, color, points, 2)
+        # Inner cross
+        pygame.draw.line(surface, color, 
+                        (x + size // 2, y + 3), 
+                        (x + size // 2, y + size - 3), 2)
+        pygame.draw.line(surface, color, 
+                        (x + 3, y + size // 2), 
+                        (x + size - 3, y + size // 2), 2)
+    
+    def draw(self, screen):
+        self.paint(screen, self.x, self.y, self.type)
+
+class Fighter:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.prev_x = x
+        self.prev_y = y
+        self.width = 20
+        self.height = 16
+        self.speed = 5
+        self.bullets = EntityStore(Bullet)
+        self.health = 100
+        self.max_health = 100
+        self.shoot_cooldown = 0
+        self.rapid_fire_timer = 0
+        self.shield_timer = 0
+        self.invincible_timer = 0
+        
+    def move(self, dx, dy):
+        self.x += dx * self.speed
+        self.y += dy * self.speed
+        
+        # Keep fighter on screen
+        self.x = max(0, min(self.x, SCREEN_WIDTH - self.width))
+        self.y = max(0, min(self.y, SCREEN_HEIGHT - self.height))
+    
+    def shoot(self, frames=1):
+        """Fire every shot due over the next frames frames
+        
+        A shot fired some frames into a multi-frame step starts that many
+        frames of its own motion back, so once the step has moved every
+        bullet by frames frames it is where it would have been.
+        """
+        cooldown = self.shoot_cooldown
+        for lag in range(frames):
+            if cooldown <= 0:
+                # Normal shot
+                Bullet.fire(self.bullets, self.x + self.width // 2 - 1, self.y + 8 * lag, 0, -8)
+                
+                # Rapid fire adds side shots
+                if self.rapid_fire_timer > 0:
+                    Bullet.fire(self.bullets, self.x + 2 + 2 * lag, self.y + 4 + 8 * lag, -2, -8)
+                    Bullet.fire(self.bullets, self.x + self.width - 4 - 2 * lag, self.y + 4 + 8 * lag, 2, -8)
+                    cooldown = 5
+                else:
+                    cooldown = 10
+                # update() counts the whole step off the cooldown afterwards
+                self.shoot_cooldown = cooldown + lag
+            cooldown = max(0, cooldown - 1)
+    
+    def activate_power_up(self, power_type):
+        if power_type == 'health':
+            self.health = min(self.max_health, self.health + 30)
+        elif power_type == 'rapid_fire':
+            self.rapid_fire_timer = 300  # 5 seconds at 60 FPS
+        elif power_type == 'shield':
+            self.shield_timer = 180  # 3 seconds
+    
+    def take_damage(self, damage):
+        if self.shield_timer > 0 or self.invincible_timer > 0:
+            return False
+        self.health -= damage
+        self.invincible_timer = 30  # Brief invincibility after hit
+        return True
+    
+    def update(self, frames=1):
+        # Update timers
+        self.shoot_cooldown = max(0, self.shoot_cooldown - frames)
+        self.rapid_fire_timer = max(0, self.rapid_fire_timer - frames)
+        self.shield_timer = max(0, self.shield_timer - frames)
+        self.invincible_timer = max(0, self.invincible_timer - frames)
+        
+        # Update bullets
+        self.bullets.integrate(frames)
+        self.bullets.cull(min_y=-10)
+        self.bullets.compact()
+    
+    def sprites(self, alpha=1.0, shield_blink=True):
+        """Sprite-cache (key, x, y) items for the current visual state"""
+        x = interpolate(self.prev_x, self.x, alpha)
+        y = interpolate(self.prev_y, self.y, alpha)
+        items = []
+        # Draw shield if active
+        if self.shield_timer > 0:
+            blink = shield_blink and (self.shield_timer // 5) % 2 == 1
+            shield_color = CGA_COLORS['WHITE'] if blink else CGA_COLORS['CYAN']
+            items.append((('shield', shield_color),
+                          int(x + self.width // 2) - 15, int(y + self.height // 2) - 15))
+        
+        # Blink when invincible
+        if self.invincible_timer > 0 and self.invincible_timer % 4 < 2:
+            return items
+        
+        wing_color = CGA_COLORS['CYAN'] if self.rapid_fire_timer > 0 else CGA_COLORS['WHITE']
+        items.append((('fighter', wing_color), x, y))
+        return items
+    
+    @staticmethod
+    def paint_shield(surface, x, y, color):
+        pygame.draw.circle(surface, color, (x + 15, y + 15), 15, 2)
+    
+    @staticmethod
+    def paint(surface, x, y, wing_color):
+        # Draw fighter jet (simple CGA style)
+        # Main body
+        pygame.draw.rect(surface, CGA_COLORS['WHITE'], 
+                        (x + 6, y + 4, 8, 12))
+        # Wings
+        pygame.draw.rect(surface, wing_color, 
+                        (x, y + 8, 20, 4))
+        # Cockpit
+        pygame.draw.rect(surface, CGA_COLORS['MAGENTA'], 
+                        (x + 8, y, 4, 8))
+    
+    def draw(self, screen):
+        for key, x, y in self.sprites():
+            SpriteCache.painters[key[0]](screen, x, y, key[1])
+        
+        # Draw bullets
+        self.bullets.fill_rects(screen, CGA_COLORS['CYAN'])
+
+class Enemy:
+    x = _Column()
+    y = _Column()
+    width = _Column()
+    height = _Column()
+    speed = _Column('dy')
+    direction = _Column('dx')
+    uid = _Column('owner')
+    health = _Column()
+    shoot_delay = _Column()
+    shoot_timer = _Column()
+    move_timer = _Column()
+    kind = _Column()  # Index in ENEMY_TYPES
+    
+    # Extra EntityStore columns for enemy state
+    COLUMNS = {
+        'health': np.int32,
+        'shoot_delay': np.int32,
+        'shoot_timer': np.int32,
+        'move_timer': np.int32,
+        'kind': np.uint8
+    }
+    SIZES = {
+        'fast': (12, 10),
+        'tank': (20, 16),
+        'basic': (16, 12)
+    }
+    next_uid = 1
+    
+    def __init__(self, x, y, enemy_type='basic', bullet_store=None, rng=random):
+        self.store = None
+        self.slot = None
+        self.uid = Enemy.next_uid
+        Enemy.next_uid += 1
+        self.x = x
+        self.y = y
+        self.type = enemy_type
+        self.width, self.height = self.SIZES.get(enemy_type, self.SIZES['basic'])
+        
+        # Type-specific properties
+        if enemy_type == 'fast':
+            self.speed = 3.5
+            self.health = 1
+            self.shoot_delay = 80
+        elif enemy_type == 'tank':
+            self.speed = 1
+            self.health = 3
+            self.shoot_delay = 40
+        else:  # basic
+            self.speed = 2
+            self.health = 1
+            self.shoot_delay = 60
+        
+        # Bullets live in a store shared by every enemy, tagged with our uid
+        self.bullet_store = bullet_store if bullet_store is not None else EntityStore(Bullet)
+        self.shoot_timer = 0
+        self.move_timer = 0
+        self.direction = rng.choice([-1, 1])
+    
+    @property
+    def type(self):
+        return ENEMY_TYPES[self.kind]
+    
+    @type.setter
+    def type(self, enemy_type):
+        self.kind = ENEMY_TYPES.index(enemy_type)
+    
+    @property
+    def bullets(self):
+        return [bullet for bullet in self.bullet_store if bullet.owner == self.uid]
+    
+    @staticmethod
+    def update_all(enemies, bullets, rng=random, frames=1):
+        """Advance every enemy in the store and the shared bullet store at once"""
+        n = enemies.count
+        x = enemies.x[:n]
+        width = enemies.width[:n]
+        direction = enemies.dx[:n]
+        enemies.y[:n] += enemies.dy[:n] * frames
+        
+        # Add some horizontal movement for variety
+        move_timer = enemies.move_timer[:n]
+        move_timer += frames
+        moving = move_timer > 30
+        x[moving] += direction[moving] * frames
+        direction[moving & ((x <= 0) | (x >= SCREEN_WIDTH - width))] *= -1
+        
+        # Shoot occasionally; a multi-frame step keeps the frames it ran
+        # past the delay, so enemies fire as often as at one frame a step
+        shoot_timer = enemies.shoot_timer[:n]
+        shoot_timer += frames
+        shoot_delay = enemies.shoot_delay[:n]
+        ready = np.flatnonzero((shoot_timer > shoot_delay) & enemies.alive[:n])
+        for slot in ready.tolist():
+            if rng.random() < 0.3:
+                enemies.handle(slot).shoot()
+        shoot_timer[ready] -= shoot_delay[ready] + 1
+        
+        # Update bullets
+        bullets.integrate(frames)
+        bullets.cull(max_y=SCREEN_HEIGHT + 10)
+        bullets.compact()
+    
+    def shoot(self):
+        x = self.x + self.width // 2
+        y = self.y + self.height
+        if self.type == 'tank':
+            # Tank shoots spread pattern
+            for angle in [-0.3, 0, 0.3]:
+                dx = math.sin(angle) * 5
+                dy = 5
+                Bullet.fire(self.bullet_store, x, y, dx, dy, self.uid)
+        else:
+            Bullet.fire(self.bullet_store, x, y, 0, 6, self.uid)
+    
+    def take_damage(self):
+        self.health -= 1
+        return self.health <= 0
+    
+    @staticmethod
+    def sprites(enemies, alpha=1.0):
+        """Sprite-cache (key, x, y) items for every live enemy in a store"""
+        live = enemies.live()
+        x, y = enemies.positions(alpha)
+        return [(('enemy', ENEMY_TYPES[kind]), x, y) for kind, x, y in
+                zip(enemies.kind[live].tolist(), x[live].tolist(), y[live].tolist())]
+    
+    @staticmethod
+    def paint(surface, x, y, enemy_type):
+        width, height = Enemy.SIZES.get(enemy_type, Enemy.SIZES['basic'])
+        # Different appearance based on type
+        if enemy_type == 'fast':
+            pygame.draw.polygon(surface, CGA_COLORS['CYAN'], [
+                (x + width // 2, y),
+                (x, y + height),
+                (x + width, y + height)
+            ])
+        elif enemy_type == 'tank':
+            pygame.draw.rect(surface, CGA_COLORS['WHITE'], 
+                           (x, y, width, height), 2)
+            pygame.draw.rect(surface, CGA_COLORS['MAGENTA'], 
+                           (x + 4, y + 4, width - 8, height - 8))
+        else:  # basic
+            pygame.draw.rect(surface, CGA_COLORS['MAGENTA'], 
+                           (x + 4, y, 8, 12))
+            pygame.draw.rect(surface, CGA_COLORS['WHITE'], 
+                           (x, y + 4, 16, 4))
+    
+    def draw(self, screen):
+        self.paint(screen, self.x, self.y, self.type)
+
+class Bullet:
+    """Handle onto one slot of a bullet EntityStore"""
+    x = _Column()
+    y = _Column()
+    dx = _Column()
+    dy = _Column()
+    width = _Column()
+    height = _Column()
+    owner = _Column()
+    
+    def __init__(self, x, y, dx, dy, is_player, owner=None):
+        self.store = None
+        self.slot = None
+        self.x = x
+        self.y = y
+        self.dx = dx
+        self.dy = dy
+        self.width = 2
+        self.height = 4 if is_player else 6
+        self.owner = PLAYER_OWNER if is_player else (owner if owner is not None else -1)
+    
+    @property
+    def is_player(self):
+        return self.owner == PLAYER_OWNER
+    
+    @staticmethod
+    def fire(store, x, y, dx, dy, owner=PLAYER_OWNER):
+        """Spawn a bullet straight into a store without creating a handle"""
+        height = 4 if owner == PLAYER_OWNER else 6
+        return store.spawn(x, y, dx, dy, 2, height, owner)
+    
+    def draw(self, screen):
+        color = CGA_COLORS['CYAN'] if self.is_player else CGA_COLORS['MAGENTA']
+        pygame.draw.rect(screen, color, 
+                        (int(self.x), int(self.y), self.width, self.height))
+
+class SpriteCache:
+    """Entity sprites baked once per (kind, state) and blitted in batches
+    
+    A sprite is painted lazily from the entity's own primitives onto a
+    colorkeyed Surface and cropped to its drawn pixels. pygame clips outlines
+    before drawing them, so anything touching the screen edge is painted
+    with the primitives instead; everywhere else the output is identical.
+    On the lower-resolution paletted canvas sprites are downsampled and
+    simply blitted clipped.
+    """
+    PAD = 16
+    painters = {
+        'fighter': Fighter.paint,
+        'shield': Fighter.paint_shield,
+        'enemy': Enemy.paint,
+        'power_up': PowerUp.paint
+    }
+    
+    def __init__(self):
+        self.sprites = {}
+    
+    def get(self, key, like):
+        """Sprite Surface (in like's format) and its offset from the entity position"""
+        entry = self.sprites.get(key)
+        if entry is None:
+            pixel = pixel_size(like)
+            canvas = surface_like(like, (64, 64))
+            canvas.fill(CGA_COLORS['BLACK'])
+            self.painters[key[0]](canvas, self.PAD, self.PAD, key[1])
+            if pixel > 1:
+                canvas = downsample(canvas, pixel)
+            canvas.set_colorkey(CGA_COLORS['BLACK'])
+            bounds = canvas.get_bounding_rect()
+            sprite = canvas.subsurface(bounds).copy()
+            entry = (sprite, (bounds.x - self.PAD // pixel, bounds.y - self.PAD // pixel))
+            self.sprites[key] = entry
+        return entry
+    
+    def draw(self, screen, items):
+        """Draw (key, x, y) items in order with as few blits calls as possible
+        
+        Returns the screen rects that were drawn to.
+        """
+        screen_rect = screen.get_rect()
+        pixel = pixel_size(screen)
+        blits = []
+        drawn = []
+        for key, x, y in items:
+            sprite, (offset_x, offset_y) = self.get(key, screen)
+            dest = sprite.get_rect(topleft=(int(x) // pixel + offset_x, int(y) // pixel + offset_y))
+            if pixel > 1 or (x >= 0 and y >= 0 and screen_rect.contains(dest)):
+                blits.append((sprite, dest))
+            else:
+                screen.blits(blits, doreturn=False)
+                blits = []
+                self.painters[key[0]](screen, x, y, key[1])
+            drawn.append(dest.clip(screen_rect))
+        screen.blits(blits, doreturn=False)
+        return drawn
+
+class DrawState:
+    """Everything Game.render needs from one step, fixed at capture time
+    
+    Sprites and rectangles are captured alpha of the way from the previous
+    step, ready to blit. With copy set the particles are copied as well, so
+    the simulation can carry on while another thread draws the state;
+    otherwise they are the live system, drawn at the same alpha.
+    """
+    __slots__ = ('frame', 'alpha', 'score', 'high_score', 'wave', 'enemies_killed_this_wave',
+                 'enemies_per_wave', 'paused', 'game_over', 'fighter', 'fighter_sprites',
+                 'bullets', 'enemy_sprites', 'enemy_bullets', 'power_up_sprites', 'particles')
+    
+    def __init__(self, game, alpha=1.0, copy=False):
+        fighter = game.fighter
+        self.frame = game.frame
+        self.alpha = alpha
+        self.score = game.score
+        self.high_score = game.high_score
+        self.wave = game.wave
+        self.enemies_killed_this_wave = game.enemies_killed_this_wave
+        self.enemies_per_wave = game.enemies_per_wave
+        self.paused = game.paused
+        self.game_over = game.game_over
+        # Just what the HUD reads
+        self.fighter = types.SimpleNamespace(health=fighter.health, max_health=fighter.max_health,
+                                             rapid_fire_timer=fighter.rapid_fire_timer,
+                                             shield_timer=fighter.shield_timer)
+        if game.game_over:
+            self.fighter_sprites = self.bullets = self.enemy_sprites = self.enemy_bullets = self.power_up_sprites = []
+        else:
+            shield_blink = game.quality.settings['shield_blink']
+            self.fighter_sprites = [item for other in game.flying() for item in other.sprites(alpha, shield_blink)]
+            pixel = pixel_size(game.screen)
+            self.bullets = [rect for other in game.fighters for rect in other.bullets.rects(alpha, pixel)]
+            self.enemy_sprites = Enemy.sprites(game.enemies, alpha)
+            self.enemy_bullets = game.enemy_bullets.rects(alpha, pixel)
+            self.power_up_sprites = [powerup.sprite(alpha) for powerup in game.power_ups]
+        self.particles = game.particles.snapshot() if copy else game.particles
+
+class Pacer:
+    """Holds a loop to one pass per SIM_DT of real time
+    
+    wait() sleeps until the next pass is due. A loop that falls more than
+    MAX_FRAME_SKIP passes behind starts again from now instead of racing
+    to catch up.
+    """
+    
+    def __init__(self):
+        self.deadline = time.perf_counter()
+    
+    def wait(self):
+        self.deadline += SIM_DT
+        delay = self.deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -MAX_FRAME_SKIP * SIM_DT:
+            self.deadline = time.perf_counter()  # Too far behind to catch up
+
+class TripleBuffer:
+    """Hands the newest DrawState from the simulation thread to the render thread
+    
+    Three slots: the one being read, the newest complete one and the one
+    being replaced. publish() never waits for the reader and latest() never
+    waits for the writer, beyond a lock held for a couple of assignments.
+    States overwritten before the reader got to them are counted.
+    """
+    
+    def __init__(self, state):
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.slots = [state, None, None]
+        self.reading = 0
+        self.newest = 0
+        self.fresh = False
+        self.published = 1
+        self.dropped = 0
+    
+    def publish(self, state):
+        with self.lock:
+            slot = next(index for index in range(3) if index not in (self.reading, self.newest))
+            self.slots[slot] = state
+            self.newest = slot
+            self.dropped += self.fresh
+            self.fresh = True
+            self.published += 1
+        self.ready.set()
+    
+    def latest(self, timeout=None):
+        """Newest published state, and whether it is new since the last call;
+        with a timeout, first wait up to that long for a new one"""
+        if timeout is not None:
+            self.ready.wait(timeout)
+        with self.lock:
+            fresh = self.fresh
+            self.reading = self.newest
+            self.fresh = False
+            self.ready.clear()
+            return self.slots[self.reading], fresh
+
+class TextureRenderer:
+    """Render backend drawing DrawStates with SDL Renderer texture copies
+    
+    Sprites, particle stamps, star tiles and the HUD overlay are still
+    painted onto Surfaces by their usual code, then uploaded to Textures
+    once each (the HUD again whenever it is rebuilt). A frame is just
+    texture copies and rect fills onto a SCREEN_WIDTH x SCREEN_HEIGHT
+    logical canvas that the renderer scales to the window. software asks
+    for SDL's software renderer, for machines without a GPU.
+    """
+    def __init__(self, title, scale=1, software=False):
+        from pygame._sdl2 import video
+        self.video = video
+        self.window = video.Window(title, size=(SCREEN_WIDTH * scale, SCREEN_HEIGHT * scale))
+        self.renderer = video.Renderer(self.window, accelerated=0 if software else -1)
+        self.renderer.logical_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.textures = {}  # Surface -> Texture, for surfaces that live as long as the game
+        self.star_textures = {}
+        self.hud_texture = video.Texture(self.renderer, (SCREEN_WIDTH, SCREEN_HEIGHT), streaming=True)
+        self.hud_texture.blend_mode = 1  # SDL_BLENDMODE_BLEND
+        self.hud_version = None
+    
+    def texture(self, surface, cache):
+        texture = cache.get(surface)
+        if texture is None:
+            texture = cache[surface] = self.video.Texture.from_surface(self.renderer, surface)
+        return texture
+    
+    def copy(self, placed, cache):
+        """Copy (surface, position) pairs, uploading surfaces seen for the first time"""
+        texture = self.texture
+        for surface, position in placed:
+            texture(surface, cache).draw(dstrect=position)
+    
+    def sprites(self, game, items):
+        get = game.sprites.get
+        like = game.screen
+        placed = []
+        for key, x, y in items:
+            sprite, (offset_x, offset_y) = get(key, like)
+            placed.append((sprite, (int(x) + offset_x, int(y) + offset_y)))
+        self.copy(placed, self.textures)
+    
+    def fill(self, color, rects):
+        renderer = self.renderer
+        renderer.draw_color = (*color, 255)
+        for rect in rects:
+            renderer.fill_rect(rect)
+    
+    def render(self, game, state):
+        renderer = self.renderer
+        renderer.draw_color = (*CGA_COLORS['BLACK'], 255)
+        renderer.clear()
+        
+        # Star tiles are re-baked as they wrap, so only the current ones are kept
+        lag = 1 - min(state.alpha, 1)
+        placed = [(tile, (0, y)) for layer in game.starfield.layers
+                  for tile, rects, y in layer.placed_tiles(game.screen, lag)]
+        self.star_textures = {tile: self.star_textures[tile] for tile, _ in placed if tile in self.star_textures}
+        self.copy(placed, self.star_textures)
+        
+        self.copy(state.particles.placed_stamps(game.screen, state.alpha), self.textures)
+        hud = game.hud
+        if not state.game_over:
+            self.sprites(game, state.fighter_sprites)
+            self.fill(CGA_COLORS['CYAN'], state.bullets)
+            self.sprites(game, state.enemy_sprites)
+            self.fill(CGA_COLORS['MAGENTA'], state.enemy_bullets)
+            self.sprites(game, state.power_up_sprites)
+            hud.compose(state)
+        else:
+            hud.compose_game_over(state)
+        
+        if hud.version != self.hud_version:
+            self.hud_texture.update(hud.overlay)
+            self.hud_version = hud.version
+        for area in hud.areas:
+            self.hud_texture.draw(srcrect=area, dstrect=area)
+        renderer.present()
+
+class HUD:
+    """Score, wave, health and power-up display
+    
+    Text is rendered once per distinct string and numbers are composed from
+    a cached digit glyph atlas. Everything is composited onto a cached
+    overlay that is only rebuilt when a displayed value changes; each frame
+    just blits the overlay areas that hold something.
+    """
+    MAX_TEXTS = 256
+    GLYPHS = "0123456789/"
+    
+    def __init__(self, font, small_font, antialias=True):
+        self.font = font
+        self.small_font = small_font
+        self.antialias = antialias  # Off for the paletted canvas, which has no in-between colors
+        self.texts = {}
+        self.glyph_atlases = {}
+        self.overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self.areas = []
+        self.state = None
+        self.flattened = None  # Overlay copy for paletted screens, see flatten()
+        self.flattened_areas = []
+        self.flattened_version = None
+        self.interval = 1  # Minimum frames between rebuilds of the same screen
+        self.age = 0
+        self.version = 0  # Bumped on every rebuild
+    
+    def text(self, font, text, color):
+        key = (font, text, color)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) >= self.MAX_TEXTS:
+                self.texts.clear()
+            surface = self.texts[key] = font.render(text, self.antialias, color)
+        return surface
+    
+    def glyphs(self, font, color):
+        key = (font, color)
+        atlas = self.glyph_atlases.get(key)
+        if atlas is None:
+            atlas = self.glyph_atlases[key] = {char: font.render(char, self.antialias, color) for char in self.GLYPHS}
+        return atlas
+    
+    def put(self, surface, pos):
+        # Transparent overlay pixels take the source pixels unchanged
+        self.areas.append(self.overlay.blit(surface, pos, special_flags=pygame.BLEND_RGBA_MAX))
+    
+    def put_number(self, pos, font, color, label, digits):
+        """Cached label followed by a digit string composed from glyphs"""
+        x, y = pos
+        if label:
+            label_surface = self.text(font, label, color)
+            self.put(label_surface, (x, y))
+            x += label_surface.get_width()
+        atlas = self.glyphs(font, color)
+        for char in digits:
+            self.put(atlas[char], (x, y))
+            x += atlas[char].get_width()
+    
+    def put_centered(self, surface, y):
+        self.put(surface, (SCREEN_WIDTH//2 - surface.get_width()//2, y))
+    
+    def rebuild(self, state):
+        self.age += 1
+        if state == self.state:
+            return False
+        if self.state is not None and state[0] == self.state[0] and self.age < self.interval:
+            return False
+        self.age = 0
+        self.version += 1
+        self.state = state
+        for area in self.areas:
+            self.overlay.fill((0, 0, 0, 0), area)
+        self.areas = []
+        return True
+    
+    def present(self, screen):
+        overlay = self.overlay
+        areas = self.areas
+        if screen.get_bitsize() == 8:
+            if self.flattened_version != self.version:
+                self.flatten(screen)
+            overlay = self.flattened
+            areas = self.flattened_areas
+        return screen.blits([(overlay, area.topleft, area) for area in areas])
+    
+    def flatten(self, screen):
+        """Blend the overlay onto black in screen's format and resolution
+        
+        8-bit surfaces can't take alpha blits, so this runs once per change
+        and the result is copied over with black as colorkey. Each area is
+        blended and quantized at full size, then shrunk to the canvas.
+        """
+        pixel = pixel_size(screen)
+        if self.flattened is None:
+            self.blended = pygame.Surface(self.overlay.get_size())
+            self.quantized = surface_like(screen, self.overlay.get_size())
+            self.flattened = surface_like(screen, screen.get_size())
+            self.flattened.set_colorkey(CGA_COLORS['BLACK'])
+        for area in self.flattened_areas:
+            self.flattened.fill(CGA_COLORS['BLACK'], area)
+        self.flattened_areas = [shrink_rect(area, pixel) for area in self.areas]
+        blocks = [pygame.Rect(area.x * pixel, area.y * pixel, area.width * pixel, area.height * pixel)
+                  for area in self.flattened_areas]
+        for block in blocks:
+            self.blended.fill(CGA_COLORS['BLACK'], block)
+            self.blended.blit(self.overlay, block, block)
+            self.quantized.blit(self.blended, block, block)
+        quantized = pygame.surfarray.pixels2d(self.quantized)
+        flattened = pygame.surfarray.pixels2d(self.flattened)
+        for area, block in zip(self.flattened_areas, blocks):
+            flattened[area.left:area.right, area.top:area.bottom] = quantized[
+                block.left:block.right, block.top:block.bottom].reshape(
+                area.width, pixel, area.height, pixel).max(axis=(1, 3))
+        del quantized, flattened  # Unlock the surfaces
+        self.flattened_version = self.version
+    
+    def draw(self, screen, game):
+        self.compose(game)
+        return self.present(screen)
+    
+    def compose(self, game):
+        """Rebuild the in-play overlay if a displayed value changed"""
+        fighter = game.fighter
+        progress = min(game.enemies_killed_this_wave, game.enemies_per_wave)
+        state = ('playing', game.score, game.wave, fighter.health, fighter.max_health,
+                 fighter.rapid_fire_timer > 0, fighter.shield_timer > 0,
+                 progress, game.enemies_per_wave, game.paused)
+        if self.rebuild(state):
+            small_font = self.small_font
+            self.put_number((10, 10), small_font, CGA_COLORS['WHITE'], "SCORE: ", str(game.score))
+            self.put_number((10, 35), small_font, CGA_COLORS['CYAN'], "WAVE: ", str(game.wave))
+            
+            # Health bar
+            health_width = 100
+            health_height = 10
+            health_x = 10
+            health_y = 60
+            self.areas.append(pygame.draw.rect(self.overlay, CGA_COLORS['WHITE'], 
+                                               (health_x, health_y, health_width, health_height), 1))
+            health_fill = int((fighter.health / fighter.max_health) * health_width)
+            if health_fill > 0:
+                health_color = CGA_COLORS['MAGENTA'] if fighter.health < 30 else CGA_COLORS['CYAN']
+                pygame.draw.rect(self.overlay, health_color, 
+                               (health_x + 1, health_y + 1, health_fill - 2, health_height - 2))
+            
+            # Power-up indicators
+            if fighter.rapid_fire_timer > 0:
+                self.put(self.text(small_font, "RAPID FIRE", CGA_COLORS['CYAN']), (SCREEN_WIDTH - 130, 10))
+            
+            if fighter.shield_timer > 0:
+                self.put(self.text(small_font, "SHIELD", CGA_COLORS['WHITE']), (SCREEN_WIDTH - 90, 35))
+            
+            # Wave progress
+            self.put_number((10, 80), small_font, CGA_COLORS['WHITE'], "", f"{progress}/{game.enemies_per_wave}")
+            
+            if game.paused:
+                self.put_centered(self.text(self.font, "PAUSED", CGA_COLORS['WHITE']), SCREEN_HEIGHT//2)
+    
+    def draw_game_over(self, screen, game):
+        self.compose_game_over(game)
+        return self.present(screen)
+    
+    def compose_game_over(self, game):
+        if self.rebuild(('game_over', game.score, game.wave, game.high_score)):
+            font = self.font
+            small_font = self.small_font
+            self.put_centered(self.text(font, "GAME OVER", CGA_COLORS['MAGENTA']), SCREEN_HEIGHT//2 - 80)
+            self.put_centered(self.text(font, f"SCORE: {game.score}", CGA_COLORS['WHITE']), SCREEN_HEIGHT//2 - 30)
+            self.put_centered(self.text(small_font, f"Reached Wave: {game.wave}", CGA_COLORS['CYAN']), SCREEN_HEIGHT//2)
+            self.put_centered(self.text(small_font, f"High Score: {game.high_score}", CGA_COLORS['CYAN']), SCREEN_HEIGHT//2 + 25)
+            self.put_centered(self.text(small_font, "Press R to Restart or Q to Quit", CGA_COLORS['WHITE']), SCREEN_HEIGHT//2 + 60)
+
+class StarLayer:
+    """One parallax layer of stars baked onto two screen-sized tiles
+    
+    The tiles are stacked in a loop scrolling down at speed pixels per
+    step; once the lower one has left the screen it moves back above the
+    other and is re-baked with fresh stars the next time it is drawn.
+    """
+    def __init__(self, speed, count, rng):
+        self.speed = speed
+        self.count = count
+        self.rng = rng
+        self.radius = 1 if speed == 1 else 2
+        self.color = CGA_COLORS['WHITE'] if speed > 1 else CGA_COLORS['CYAN']
+        self.scroll = rng.randrange(SCREEN_HEIGHT)  # Top of the lower tile
+        self.tiles = [None, None]  # (surface, star rects), lower tile first
+    
+    def update(self, frames=1):
+        self.scroll += self.speed * frames
+        if self.scroll >= SCREEN_HEIGHT:
+            self.scroll -= SCREEN_HEIGHT
+            self.tiles = [self.tiles[1], None]
+    
+    def bake(self, like):
+        pixel = pixel_size(like)
+        tile = surface_like(like, like.get_size())
+        radius = self.radius // pixel
+        rects = []
+        for _ in range(self.count):
+            x = self.rng.randint(0, SCREEN_WIDTH) // pixel
+            y = self.rng.randint(0, SCREEN_HEIGHT) // pixel
+            if radius:
+                rects.append(pygame.draw.circle(tile, self.color, (x, y), radius))
+            else:
+                rects.append(tile.fill(self.color, (x, y, 1, 1)))
+        # Mostly-empty tiles blit fastest run-length encoded
+        tile.set_colorkey(CGA_COLORS['BLACK'], pygame.RLEACCEL)
+        return tile, rects
+    
+    def placed_tiles(self, like, lag):
+        """(tile, star rects, y) for both tiles, baking any that are missing"""
+        # Right after a wrap the lower tile is gone, so the interpolated
+        # position can't go above the top of the screen
+        top = max(0, int(self.scroll - self.speed * lag)) // pixel_size(like)
+        placed = []
+        for index, y in enumerate((top, top - like.get_height())):
+            if self.tiles[index] is None:
+                self.tiles[index] = self.bake(like)
+            placed.append((*self.tiles[index], y))
+        return placed
+    
+    def draw(self, screen, lag, star_rects=False):
+        drawn = []
+        height = screen.get_height()
+        for tile, rects, y in self.placed_tiles(screen, lag):
+            blit = screen.blit(tile, (0, y))
+            if star_rects:
+                drawn += [rect.move(0, y) for rect in rects if -rect.bottom < y < height - rect.y]
+            else:
+                drawn.append(blit)
+        return drawn
+
+class StarField:
+    """Scrolling star background: one pre-baked layer per speed, far to near"""
+    LAYERS = ((1, 80), (2, 30), (3, 15))  # Speed and stars per screen
+    
+    def __init__(self, rng=random, density=1.0):
+        self.layers = [StarLayer(speed, int(count * density), rng) for speed, count in self.LAYERS]
+    
+    def set_density(self, density):
+        """Stars per layer from now on; tiles already baked keep theirs until
+        they scroll off, so the change fades in rather than popping"""
+        for layer, (speed, count) in zip(self.layers, self.LAYERS):
+            layer.count = int(count * density)
+    
+    def update(self, frames=1):
+        for layer in self.layers:
+            layer.update(frames)
+    
+    def draw(self, screen, alpha=1.0, star_rects=False):
+        """Blit every layer; returns the blitted areas, or each star's area
+        if star_rects is set (for dirty-rect rendering)"""
+        lag = 1 - min(alpha, 1)
+        drawn = []
+        for layer in self.layers:
+            drawn += layer.draw(screen, lag, star_rects)
+        return drawn
+
+class NullProfiler:
+    """Profiler stand-in used while profiling is off; every hook is a no-op"""
+    enabled = False
+    visible = False
+    
+    def begin_frame(self):
+        pass
+    
+    def mark(self, phase):
+        pass
+    
+    def end_frame(self, game):
+        pass
+    
+    def draw(self, screen, font):
+        return []
+
+class FrameProfiler(NullProfiler):
+    """Per-frame phase timings and entity counts in a ring buffer
+    
+    mark(phase) charges the time since the previous mark to phase, so the
+    marks placed through Game.run and Game.update split each frame into
+    consecutive phases. Phases hit several times in one rendered frame
+    (several simulation steps) accumulate. Only the thread that begins the
+    frames records marks.
+    """
+    enabled = True
+    PHASES = ('events', 'input', 'starfield', 'spawn', 'fighter', 'enemies',
+              'power_ups', 'particles', 'collisions', 'draw', 'frame')
+    COUNTS = ('enemies', 'bullets', 'particles', 'quality')
+    BUDGET_MS = 1000 / FPS
+    GRAPH_SIZE = (180, 60)
+    
+    def __init__(self, capacity=600, visible=False):
+        self.capacity = capacity
+        self.visible = visible
+        self.times = np.zeros((capacity, len(self.PHASES)))
+        self.counts = np.zeros((capacity, len(self.COUNTS)), np.int32)
+        self.columns = {phase: column for column, phase in enumerate(self.PHASES)}
+        self.frames = 0  # Frames recorded in total
+        self.row = self.times[0]
+        self.start = self.last = time.perf_counter()
+        self.labels = []
+        self.thread = threading.get_ident()
+    
+    def begin_frame(self):
+        self.thread = threading.get_ident()
+        self.row = self.times[self.frames % self.capacity]
+        self.row[:] = 0
+        self.start = self.last = time.perf_counter()
+    
+    def mark(self, phase):
+        if threading.get_ident() != self.thread:
+            return
+        now = time.perf_counter()
+        self.row[self.columns[phase]] += now - self.last
+        self.last = now
+    
+    def end_frame(self, game):
+        self.row[-1] = time.perf_counter() - self.start
+        self.counts[self.frames % self.capacity] = (
+            len(game.enemies), sum(len(fighter.bullets) for fighter in game.fighters) + len(game.enemy_bullets), len(game.particles),
+            game.quality.level)
+        self.frames += 1
+    
+    def recent(self):
+        """Rows of recorded frames, oldest first, times in milliseconds"""
+        count = min(self.frames, self.capacity)
+        order = (np.arange(count) + self.frames - count) % self.capacity
+        return self.times[order] * 1000, self.counts[order]
+    
+    def draw(self, screen, font):
+        """Frame-time graph against the budget line plus the slowest phases"""
+        pixel = pixel_size(screen)
+        width, height = (size // pixel for size in self.GRAPH_SIZE)
+        left = screen.get_width() - width - 10 // pixel
+        top = screen.get_height() - height - 10 // pixel
+        drawn = [screen.fill(CGA_COLORS['BLACK'], (left, top, width, height))]
+        times, counts = self.recent()
+        frame_ms = times[-width:, -1]
+        
+        # One column per frame, scaled so the budget sits at half height
+        scale = height / 2 / self.BUDGET_MS
+        bars = np.minimum(height, (frame_ms * scale).astype(int)).tolist()
+        for x, (bar, ms) in enumerate(zip(bars, frame_ms.tolist())):
+            color = CGA_COLORS['CYAN'] if ms <= self.BUDGET_MS else CGA_COLORS['MAGENTA']
+            screen.fill(color, (left + x, top + height - bar, 1, bar))
+        screen.fill(CGA_COLORS['WHITE'], (left, top + height - int(self.BUDGET_MS * scale), width, 1))
+        
+        # Text is only re-rendered twice a second
+        if self.frames % (FPS // 2) == 0 or not self.labels:
+            mean = times[-FPS:].mean(axis=0) if len(times) else np.zeros(len(self.PHASES))
+            slowest = sorted(zip(mean[:-1].tolist(), self.PHASES[:-1]), reverse=True)[:3]
+            enemies, bullets, particles, quality = counts[-1].tolist() if len(counts) else (0, 0, 0, 0)
+            lines = [f"{mean[-1]:.1f} ms  E{enemies} B{bullets} P{particles} Q{quality}"]
+            lines += [f"{phase} {ms:.2f}" for ms, phase in slowest]
+            antialias = screen.get_bitsize() > 8
+            self.labels = [font.render(line, antialias, CGA_COLORS['WHITE'], CGA_COLORS['BLACK']) for line in lines]
+        y = top - 4 // pixel
+        for label in reversed(self.labels):
+            y -= label.get_height()
+            drawn.append(screen.blit(label, (left, y)))
+        return drawn
+    
+    def write_csv(self, path):
+        times, counts = self.recent()
+        first = self.frames - len(times)
+        with open(path, 'w') as f:
+            f.write(",".join(['frame'] + [f"{phase}_ms" for phase in self.PHASES] + list(self.COUNTS)) + "\n")
+            for index, (row, count) in enumerate(zip(times.tolist(), counts.tolist())):
+                f.write(",".join([str(first + index)] + [f"{ms:.4f}" for ms in row] + [str(n) for n in count]) + "\n")
+
+class QualityGovernor:
+    """Trades visual quality for frame time when frames run over budget
+    
+    Level 0 is full quality; each level up caps explosion particles lower,
+    thins the star field, drops the shield blink and refreshes the HUD less
+    often. update() takes each frame's work time (everything but waiting
+    for the next frame) and, over a WINDOW-frame average, steps the level up
+    above DOWN of the budget and back down below UP of it. A change only
+    happens HOLD frames after the previous one, so its effect is measured
+    first, and stepping back up waits UP_HOLD frames, doubling each time a
+    step up has to be undone soon after, so it settles instead of
+    oscillating. decisions lists every change with the average behind it.
+    """
+    LEVELS = (
+        {'explosion_particles': 15, 'star_density': 1.0, 'shield_blink': True, 'hud_interval': 1},
+        {'explosion_particles': 8, 'star_density': 0.6, 'shield_blink': True, 'hud_interval': 2},
+        {'explosion_particles': 4, 'star_density': 0.35, 'shield_blink': False, 'hud_interval': 6},
+        {'explosion_particles': 2, 'star_density': 0.2, 'shield_blink': False, 'hud_interval': 15}
+    )
+    WINDOW = 30
+    DOWN = 0.9
+    UP = 0.5
+    HOLD = 60
+    UP_HOLD = 180
+    MAX_UP_HOLD = 60 * FPS
+    
+    def __init__(self, budget=SIM_DT, level=0, adaptive=True):
+        self.budget = budget
+        self.level = level
+        self.adaptive = adaptive
+        self.times = np.zeros(self.WINDOW)
+        self.frames = 0  # Frames measured at the current level
+        self.up_hold = self.UP_HOLD
+        self.stepped_up = None  # Frame of the last step back up
+        self.decisions = []
+    
+    @property
+    def settings(self):
+        return self.LEVELS[self.level]
+    
+    def average(self):
+        """Mean work time over the last WINDOW frames at this level, in seconds"""
+        return float(self.times[:min(self.frames, self.WINDOW)].mean()) if self.frames else 0.0
+    
+    def update(self, work_time, frame):
+        """Record one frame's work time; True if the level changed"""
+        self.times[self.frames % self.WINDOW] = work_time
+        self.frames += 1
+        if not self.adaptive or self.frames < max(self.WINDOW, self.HOLD):
+            return False
+        average = self.average()
+        if average > self.DOWN * self.budget and self.level < len(self.LEVELS) - 1:
+            if self.stepped_up is not None and frame - self.stepped_up < 2 * self.up_hold:
+                self.up_hold = min(2 * self.up_hold, self.MAX_UP_HOLD)
+            self.change(self.level + 1, average, frame)
+            return True
+        if average < self.UP * self.budget and self.level > 0 and self.frames >= self.up_hold:
+            self.stepped_up = frame
+            self.change(self.level - 1, average, frame)
+            return True
+        return False
+    
+    def change(self, level, average, frame):
+        self.decisions.append({'frame': frame, 'from': self.level, 'to': level, 'average_ms': average * 1000})
+        self.level = level
+        self.frames = 0
+    
+    def report(self):
+        return {'level': self.level, 'settings': dict(self.settings), 'average_ms': self.average() * 1000,
+                'budget_ms': self.budget * 1000, 'decisions': list(self.decisions)}
+
+class KeyboardInput:
+    """Input source reading the live keyboard and pause presses from Game.run"""
+    def poll(self, game):
+        keys = pygame.key.get_pressed()
+        buttons = 0
+        if game.pause_pressed:
+            buttons |= INPUT_PAUSE
+            game.pause_pressed = False
+        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+            buttons |= INPUT_LEFT
+        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+            buttons |= INPUT_RIGHT
+        if keys[pygame.K_UP] or keys[pygame.K_w]:
+            buttons |= INPUT_UP
+        if keys[pygame.K_DOWN] or keys[pygame.K_s]:
+            buttons |= INPUT_DOWN
+        if keys[pygame.K_SPACE]:
+            buttons |= INPUT_FIRE
+        return buttons
+
+class ScriptedInput:
+    """Input source playing back a list of INPUT_* bitmasks, one per frame
+    
+    buttons may also be a callable taking (frame, game). Past the end of a
+    list the script loops if loop is set and holds no buttons otherwise.
+    """
+    def __init__(self, buttons=(), loop=False):
+        self.buttons = buttons
+        self.loop = loop
+        self.frame = 0
+    
+    def poll(self, game):
+        """Buttons for the next step; a multi-frame step gets every button
+        held during any of its frames"""
+        frame = self.frame
+        self.frame += game.step_frames
+        if callable(self.buttons):
+            return self.buttons(frame, game)
+        buttons = 0
+        for frame in range(frame, self.frame):
+            buttons |= self.button(frame)
+        return buttons
+    
+    def button(self, frame):
+        if self.loop and self.buttons:
+            return self.buttons[frame % len(self.buttons)]
+        return self.buttons[frame] if frame < len(self.buttons) else 0
+
+class InputRecorder:
+    """Input source wrapper logging every polled bitmask to a replay file
+    
+    The file is a header holding the game seed followed by one byte per
+    frame, appended in blocks of block frames as the game runs so a crash
+    loses at most one block. load() returns (seed, frames) for playback
+    through ScriptedInput.
+    """
+    MAGIC = b'CGAREPLY'
+    HEADER = struct.Struct('<8sq')
+    
+    def __init__(self, source, path, seed, block=FPS):
+        self.source = source
+        self.block = block
+        self.frames = 0
+        self.pending = bytearray()
+        self.file = open(path, 'wb')
+        self.file.write(self.HEADER.pack(self.MAGIC, seed))
+    
+    def poll(self, game):
+        buttons = self.source.poll(game)
+        if self.file is not None:
+            self.pending.append(buttons)
+            self.frames += 1
+            if len(self.pending) >= self.block:
+                self.flush()
+        return buttons
+    
+    def flush(self):
+        self.file.write(self.pending)
+        self.file.flush()
+        self.pending.clear()
+    
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < cls.HEADER.size or data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        seed = cls.HEADER.unpack_from(data)[1]
+        return seed, data[cls.HEADER.size:]
+
+class SaveState:
+    """Binary snapshots of a game's complete simulation state
+    
+    capture() packs the counters, fighters, entity stores, power-ups, live
+    particles and random generator state into a fixed-layout blob with
+    struct and NumPy buffers; restore() writes one back into a game,
+    which then plays on exactly as it did from that point. The starfield
+    is scenery with its own generator and keeps scrolling.
+    """
+    MAGIC = b'CGASTATE'
+    # Frame, flash/enemy spawn/power-up spawn timers, score, wave, kills
+    # this wave, wave size, damage taken, high score, next enemy and
+    # power-up uids, flags
+    HEADER = struct.Struct('<8sI9iIIB')
+    GAME_OVER = 1
+    PAUSED = 2
+    # x, y, previous x, y, health, shoot cooldown, rapid-fire, shield and invincibility timers
+    FIGHTER = struct.Struct('<4d5i')
+    COUNT = struct.Struct('<I')
+    POWER_UP = struct.Struct('<3dBI')  # x, y, previous y, type, uid
+    PARTICLES = struct.Struct('<IIIB')  # Capacity, head, span (see capture), palette colors
+    PARTICLE_FIELDS = ('x', 'y', 'px', 'py', 'vx', 'vy', 'life', 'color', 'size')
+    RNG = struct.Struct('<625I?d')  # Mersenne Twister words and index, cached gauss
+    
+    @staticmethod
+    def runs(head, capacity, span):
+        """Slices covering the span ring slots written last before head"""
+        start = (head - span) % capacity
+        end = start + span
+        if end <= capacity:
+            return [slice(start, end)]
+        return [slice(start, capacity), slice(0, end - capacity)]
+    
+    @classmethod
+    def capture(cls, game):
+        """The game's state as a new bytearray"""
+        flags = (cls.GAME_OVER if game.game_over else 0) | (cls.PAUSED if game.paused else 0)
+        out = bytearray(cls.HEADER.pack(
+            cls.MAGIC, game.frame, game.flash_timer, game.enemy_spawn_timer, game.powerup_spawn_timer,
+            game.score, game.wave, game.enemies_killed_this_wave, game.enemies_per_wave, game.damage_taken,
+            game.high_score, Enemy.next_uid, PowerUp.next_uid, flags))
+        out += cls.COUNT.pack(len(game.fighters))
+        for fighter in game.fighters:
+            out += cls.FIGHTER.pack(fighter.x, fighter.y, fighter.prev_x, fighter.prev_y, fighter.health,
+                                    fighter.shoot_cooldown, fighter.rapid_fire_timer, fighter.shield_timer,
+                                    fighter.invincible_timer)
+            fighter.bullets.dump(out)
+        game.enemies.dump(out)
+        game.enemy_bullets.dump(out)
+        
+        out += cls.COUNT.pack(len(game.power_ups))
+        for powerup in game.power_ups:
+            out += cls.POWER_UP.pack(powerup.x, powerup.y, powerup.prev_y,
+                                     POWER_UP_TYPES.index(powerup.type), powerup.uid)
+        
+        # Dead particles are overwritten whole when reused, so only the
+        # span of newest slots reaching back to the oldest live one is kept
+        particles = game.particles
+        capacity, head = particles.capacity, particles.head
+        live = np.flatnonzero(particles.life > 0)
+        span = capacity - int(((live - head) % capacity).min()) if len(live) else 0
+        out += cls.PARTICLES.pack(capacity, head, span, len(particles.palette))
+        for color in particles.palette:
+            out += bytes(color)
+        runs = cls.runs(head, capacity, span)
+        for name in cls.PARTICLE_FIELDS:
+            values = getattr(particles, name)
+            for run in runs:
+                out += values[run].data
+        
+        _, words, gauss = game.rng.getstate()
+        out += cls.RNG.pack(*words, gauss is not None, gauss or 0.0)
+        return out
+    
+    @classmethod
+    def restore(cls, game, data):
+        """Put the game back into the state captured in data"""
+        if data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError("not a save state")
+        (_, game.frame, game.flash_timer, game.enemy_spawn_timer, game.powerup_spawn_timer,
+         game.score, game.wave, game.enemies_killed_this_wave, game.enemies_per_wave, game.damage_taken,
+         game.high_score, Enemy.next_uid, PowerUp.next_uid, flags) = cls.HEADER.unpack_from(data)
+        game.game_over = bool(flags & cls.GAME_OVER)
+        game.paused = bool(flags & cls.PAUSED)
+        offset = cls.HEADER.size
+        
+        count, = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        while len(game.fighters) < count:
+            game.add_fighter()
+        del game.fighters[count:]
+        for fighter in game.fighters:
+            (fighter.x, fighter.y, fighter.prev_x, fighter.prev_y, fighter.health, fighter.shoot_cooldown,
+             fighter.rapid_fire_timer, fighter.shield_timer, fighter.invincible_timer) = cls.FIGHTER.unpack_from(data, offset)
+            offset = fighter.bullets.load(data, cls.FIGHTER.size + offset)
+        
+        offset = game.enemies.load(data, offset)
+        offset = game.enemy_bullets.load(data, offset)
+        
+        count, = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        game.power_ups = []
+        for _ in range(count):
+            x, y, prev_y, power_type, uid = cls.POWER_UP.unpack_from(data, offset)
+            offset += cls.POWER_UP.size
+            powerup = PowerUp.__new__(PowerUp)
+            powerup.__dict__.update(x=x, y=y, prev_y=prev_y, width=PowerUp.SIZE, height=PowerUp.SIZE,
+                                    speed=2, type=POWER_UP_TYPES[power_type], uid=uid)
+            game.power_ups.append(powerup)
+        
+        particles = game.particles
+        capacity, particles.head, span, colors = cls.PARTICLES.unpack_from(data, offset)
+        offset += cls.PARTICLES.size
+        if capacity != particles.capacity:
+            raise ValueError(f"save state is for {capacity} particles, not {particles.capacity}")
+        palette = [tuple(data[start:start + 3]) for start in range(offset, offset + 3 * colors, 3)]
+        offset += 3 * colors
+        # The palette only grows, so stamps cached for a longer one still fit
+        if particles.palette[:colors] != palette:
+            particles.palette = palette
+            particles.stamps = {}
+        runs = cls.runs(particles.head, capacity, span)
+        particles.life[:] = 0
+        for name in cls.PARTICLE_FIELDS:
+            values = getattr(particles, name)
+            for run in runs:
+                count = run.stop - run.start
+                values[run] = np.frombuffer(data, values.dtype, count, offset)
+                offset += count * values.itemsize
+        
+        *words, has_gauss, gauss = cls.RNG.unpack_from(data, offset)
+        game.rng.setstate((3, tuple(words), gauss if has_gauss else None))
+
+class Rollback:
+    """Input source wrapper keeping save states of the last capacity steps
+    
+    Each poll captures the game before passing the polled bitmask on, so
+    every entry is the state a step started from plus the buttons that
+    drove it. rewind() puts the game back to the start of an earlier
+    step; resimulate() then plays forward again to where it was, through
+    the recorded buttons or replacements for them.
+    """
+    def __init__(self, source, capacity=FPS * 5):
+        self.source = source
+        self.capacity = capacity
+        self.states = [None] * capacity
+        self.buttons = bytearray(capacity)
+        self.head = 0  # Next entry to write
+        self.count = 0
+        self.replay = []  # Buttons fed back instead of polling, next last
+    
+    def poll(self, game):
+        buttons = self.replay.pop() if self.replay else self.source.poll(game)
+        self.states[self.head] = SaveState.capture(game)
+        self.buttons[self.head] = buttons
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return buttons
+    
+    def rewind(self, game, steps=1):
+        """Restore the state from steps polls back (as many as are kept at
+        most) and forget the steps after it; returns their buttons in order"""
+        steps = min(steps, self.count)
+        if steps == 0:
+            return []
+        self.head = (self.head - steps) % self.capacity
+        self.count -= steps
+        SaveState.restore(game, self.states[self.head])
+        return [self.buttons[(self.head + index) % self.capacity] for index in range(steps)]
+    
+    def resimulate(self, game, steps, buttons=None):
+        """Rewind steps polls and step through them again, polling buttons
+        (the recorded ones by default) instead of the source"""
+        recorded = self.rewind(game, steps)
+        self.replay = list(reversed(buttons if buttons is not None else recorded))
+        for _ in recorded:
+            game.step()
+        self.replay = []
+
+class NullEventLog:
+    """Event log stand-in used while logging is off; nothing is recorded or persisted"""
+    high_score = 0
+    dropped = 0
+    
+    def emit(self, kind, frame, **fields):
+        pass
+    
+    def close(self):
+        pass
+
+class EventLog(NullEventLog):
+    """Game events appended to a line-delimited JSON file by a background thread
+    
+    emit() only queues a dict and never waits: when the bounded queue is
+    full the event is dropped and counted instead. The writer thread turns
+    whatever has queued up into lines and writes them in batches of at most
+    BATCH_BYTES, so a slow disk costs events rather than frames. The file
+    is also the high score store: the thread first reads back the last
+    game_over event, whose high_score the game picks up at its next game
+    over.
+    """
+    QUEUE_SIZE = 4096
+    BATCH_BYTES = 64 * 1024
+    
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue(self.QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.write_events, name='event-log', daemon=True)
+        self.thread.start()
+    
+    def emit(self, kind, frame, **fields):
+        try:
+            self.queue.put_nowait(dict(event=kind, frame=frame, **fields))
+        except queue.Full:
+            self.dropped += 1
+    
+    def close(self, timeout=2.0):
+        """Write out everything queued so far and stop the thread"""
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self.thread.join(timeout)
+    
+    def write_events(self):
+        self.high_score = self.load_high_score()
+        with open(self.path, 'a') as f:
+            closing = False
+            while not closing:
+                event = self.queue.get()
+                batch = []
+                size = 0
+                while True:
+                    if event is None:
+                        closing = True
+                        break
+                    line = json.dumps(event, separators=(',', ':'))
+                    batch.append(line)
+                    size += len(line) + 1
+                    if size >= self.BATCH_BYTES:
+                        break
+                    try:
+                        event = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    f.write('\n'.join(batch) + '\n')
+                    f.flush()
+    
+    def load_high_score(self):
+        """high_score of the last game_over event, read backwards from the end of the file"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return 0
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            partial = b''
+            while end > 0:
+                start = max(0, end - self.BATCH_BYTES)
+                f.seek(start)
+                lines = (f.read(end - start) + partial).split(b'\n')
+                partial = lines.pop(0) if start else b''  # May continue in the previous chunk
+                for line in reversed(lines):
+                    if b'"event":"game_over"' in line:
+                        try:
+                            return int(json.loads(line)['high_score'])
+                        except (ValueError, KeyError):
+                            pass
+                end = start
+        return 0
+
+class FrameCapture:
+    """Presented frames written to numbered files by a pool of worker processes
+    
+    grab() only copies the screen's pixel buffer as it is, palette indices
+    or packed RGB, and queues it; when the bounded queue is full the frame
+    is dropped and counted so slow encoding never holds up the loop. The
+    workers convert each frame and write it to directory as a PNG or, for
+    the 'cga' format, as raw 2-bit CGA_COLORS indices packed four pixels
+    to a byte, leftmost pixel in the top bits. Files are numbered by frame
+    presented, so dropped frames leave gaps.
+    """
+    QUEUE_SIZE = 8
+    FORMATS = ('png', 'cga')
+    
+    def __init__(self, directory, format='png', workers=None):
+        import multiprocessing
+        if format not in self.FORMATS:
+            raise ValueError(f"unknown capture format {format!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.presented = 0
+        self.queued = 0
+        self.dropped = 0
+        self.queue = multiprocessing.Queue(self.QUEUE_SIZE)
+        self.workers = [multiprocessing.Process(target=self.encode_frames, args=(self.queue, directory, format),
+                                                name=f'capture-{index}', daemon=True)
+                        for index in range(workers or max(1, (os.cpu_count() or 1) - 1))]
+        for worker in self.workers:
+            worker.start()
+    
+    def grab(self, surface, colors=None):
+        """Queue a copy of surface; colors are the displayed CGA_COLORS of a paletted one"""
+        number = self.presented
+        self.presented += 1
+        if self.queue.full():
+            self.dropped += 1
+            return
+        frame = (number, surface.get_buffer().raw, surface.get_size(), surface.get_pitch(), surface.get_bytesize(),
+                 surface.get_shifts(), colors)
+        try:
+            self.queue.put_nowait(frame)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+    
+    def close(self, timeout=10.0, log=print):
+        """Let the workers finish what is queued and stop them, terminating
+        any that haven't within timeout seconds"""
+        for _ in self.workers:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for worker in self.workers:
+            worker.join(timeout)
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        if any(worker.exitcode for worker in self.workers):
+            # Nobody will read what is left, so don't wait to flush it at exit
+            self.queue.cancel_join_thread()
+        self.queue.close()
+        log(f"captured {self.queued} of {self.presented} frames to {self.directory} ({self.dropped} dropped)")
+    
+    @classmethod
+    def encode_frames(cls, frames, directory, format):
+        while True:
+            frame = frames.get()
+            if frame is None:
+                return
+            number, raw, (width, height), pitch, bytesize, shifts, colors = frame
+            pixels = np.frombuffer(raw, np.uint8).reshape(height, pitch)[:, :width * bytesize]
+            if bytesize == 1:
+                indices = pixels
+            else:
+                # Channel bytes of little-endian pixels, picked by their shifts
+                pixels = pixels.reshape(height, width, bytesize)[..., [shift // 8 for shift in shifts[:3]]]
+                if format == 'cga':
+                    # Blended HUD pixels go to the nearest of the four colors
+                    cga = np.array(list(CGA_COLORS.values()), np.int32)
+                    indices = ((pixels[..., None, :] - cga) ** 2).sum(axis=-1).argmin(axis=-1).astype(np.uint8)
+            
+            path = os.path.join(directory, f'frame_{number:06d}.{format}')
+            if format == 'cga':
+                quads = indices.reshape(height, width // 4, 4)
+                packed = quads[..., 0] << 6 | quads[..., 1] << 4 | quads[..., 2] << 2 | quads[..., 3]
+                with open(path, 'wb') as f:
+                    f.write(packed.tobytes())
+            elif bytesize == 1:
+                image = pygame.image.frombuffer(np.ascontiguousarray(indices).tobytes(),
+                                                (width, height), 'P')
+                image.set_palette(colors)
+                pygame.image.save(image, path)
+            else:
+                pygame.image.save(pygame.image.frombuffer(np.ascontiguousarray(pixels).tobytes(),
+                                                          (width, height), 'RGB'), path)
+
+def pilot_policy(frame, game):
+    """Scripted pilot for batch runs: hold fire, stay low, sidestep enemy
+    bullets and enemies closing in, otherwise line up under the lowest enemy"""
+    fighter = game.fighter
+    center = fighter.x + fighter.width / 2
+    buttons = INPUT_FIRE
+    if fighter.y < SCREEN_HEIGHT - 50:
+        buttons |= INPUT_DOWN
+    
+    threats = []
+    for store, reach in ((game.enemy_bullets, 90), (game.enemies, 60)):
+        n = store.count
+        x = store.x[:n] + store.width[:n] / 2
+        y = store.y[:n] + store.height[:n]
+        near = (store.alive[:n] & (y > fighter.y - reach) & (store.y[:n] < fighter.y + fighter.height)
+                & (np.abs(x - center) < fighter.width + store.width[:n]))
+        threats += x[near].tolist()
+    if threats:
+        # Dodge away from the threats, turning back at the screen edges
+        threat = sum(threats) / len(threats)
+        if threat >= center and fighter.x > fighter.speed or fighter.x >= SCREEN_WIDTH - fighter.width - fighter.speed:
+            return buttons | INPUT_LEFT
+        return buttons | INPUT_RIGHT
+    
+    n = game.enemies.count
+    alive = np.flatnonzero(game.enemies.alive[:n])
+    if len(alive):
+        target = alive[np.argmax(game.enemies.y[alive])]
+        offset = game.enemies.x[target] + game.enemies.width[target] / 2 - center
+        if offset < -fighter.speed:
+            buttons |= INPUT_LEFT
+        elif offset > fighter.speed:
+            buttons |= INPUT_RIGHT
+    return buttons
+
+class Autopilot:
+    """Input source that plans every step from where threats are heading
+    
+    Each poll builds a hazard index: enemy bullets and enemies whose path
+    over the horizon stays out of the fighter's reach are culled straight
+    from the store columns, then the horizon is cut into SLICE-frame slices
+    and every remaining threat is swept along its dx/dy over each slice,
+    giving one bounding box per threat and slice. The box covering all
+    nine moves (each direction bitmask held for the whole horizon) in a
+    slice is tested against that slice's column in one broadcast overlap,
+    and only the (threat, slice) pairs that meet are checked frame by
+    frame: each axis gives a bitmask of overlapping frames for its three
+    directions, and the lowest bit both axes share is a move's first hit
+    there. The move whose first hit comes latest wins; among equally
+    safe moves the one lining up a shot on the lowest enemy (led by its
+    drift) or a falling power-up, low on the screen, is preferred. Fire
+    is held throughout, and pause presses from Game.run are passed on.
+    """
+    HORIZON = 24  # Frames looked ahead
+    SLICE = 6
+    MARGIN = 3  # Extra pixels around every threat
+    HOME_Y = SCREEN_HEIGHT - 50  # Preferred height
+    BULLET_SPEED = 8  # Player bullet speed, for leading shots
+    
+    def __init__(self):
+        self.frames = np.arange(1, self.HORIZON + 1)
+        self.slice_start = self.frames[::self.SLICE]  # First frame of each slice
+        # One bit per frame of a slice, and the lowest bit set in each mask
+        self.frame_bits = (1 << np.arange(self.SLICE)).astype(np.uint8)
+        self.lowest_bit = np.array([self.HORIZON] + [(mask & -mask).bit_length() - 1
+                                                     for mask in range(1, 1 << self.SLICE)])
+        self.directions = np.array([-1, 0, 1])
+        moves = [(dx, dy) for dx in self.directions.tolist() for dy in self.directions.tolist()]
+        self.move_x = np.array([dx for dx, _ in moves])
+        self.move_y = np.array([dy for _, dy in moves])
+        self.buttons = [INPUT_FIRE | (INPUT_LEFT if dx < 0 else INPUT_RIGHT if dx > 0 else 0)
+                        | (INPUT_UP if dy < 0 else INPUT_DOWN if dy > 0 else 0) for dx, dy in moves]
+    
+    def threats(self, game):
+        """x, y, width, height, dx, dy of every live enemy bullet and enemy
+        that sweeps into somewhere the fighter can get to over the horizon"""
+        fighter = game.fighter
+        # Everywhere the fighter can be over the horizon, kept on the screen
+        reach = fighter.speed * self.HORIZON
+        left, top = max(0, fighter.x - reach), max(0, fighter.y - reach)
+        right = min(SCREEN_WIDTH, fighter.x + fighter.width + reach)
+        bottom = min(SCREEN_HEIGHT, fighter.y + fighter.height + reach)
+        later = self.HORIZON - 1
+        margin = self.MARGIN
+        columns = []
+        for store in (game.enemy_bullets, game.enemies):
+            n = store.count
+            x, y, w, h, dx, dy = store.x[:n], store.y[:n], store.width[:n], store.height[:n], store.dx[:n], store.dy[:n]
+            # The box each one covers from the first frame to the last
+            near = np.flatnonzero(store.alive[:n] & rects_overlap(
+                x + np.minimum(dx, 0) * later - margin + dx, y + np.minimum(dy, 0) * later - margin + dy,
+                w + np.abs(dx) * later + 2 * margin, h + np.abs(dy) * later + 2 * margin,
+                left, top, right - left, bottom - top))
+            columns.append([x[near], y[near], w[near], h[near], dx[near], dy[near]])
+        return [np.concatenate(pair) for pair in zip(*columns)]
+    
+    def target(self, game):
+        """Center x to line up under, or None"""
+        fighter = game.fighter
+        for powerup in game.power_ups:
+            if fighter.y - 200 < powerup.y < fighter.y:
+                return powerup.x + powerup.width / 2
+        enemies = game.enemies
+        live = enemies.live()
+        if len(live) == 0:
+            return None
+        slot = live[np.argmax(enemies.y[live])]
+        frames = max(0.0, (fighter.y - enemies.y[slot]) / (self.BULLET_SPEED + enemies.dy[slot]))
+        return enemies.x[slot] + enemies.width[slot] / 2 + enemies.dx[slot] * frames
+    
+    def sweep(self, position, size, velocity, frames, starts):
+        """Low edge and length, along one axis, of the span each threat covers
+        over frames frames from each of starts, as (threat, start) arrays"""
+        low = (position + np.minimum(velocity, 0) * (frames - 1) - self.MARGIN)[:, None] + np.outer(velocity, starts)
+        return low, (size + np.abs(velocity) * (frames - 1) + 2 * self.MARGIN)[:, None]
+    
+    def poll(self, game):
+        fighter = game.fighter
+        horizon = self.HORIZON
+        margin = self.MARGIN
+        
+        # Fighter position for each way of moving along an axis (rows: back,
+        # still, forward) after every frame (columns)
+        step = np.outer(self.directions, fighter.speed * self.frames)
+        fx = np.clip(fighter.x + step, 0, SCREEN_WIDTH - fighter.width)
+        fy = np.clip(fighter.y + step, 0, SCREEN_HEIGHT - fighter.height)
+        
+        first_hit = np.full((len(self.directions), len(self.directions)), horizon + 1)
+        x, y, w, h, dx, dy = self.threats(game)
+        if len(x):
+            # Hazard index: every threat's box over every slice, against
+            # the box covering every move over the same slice
+            left, width = self.sweep(x, w, dx, self.SLICE, self.slice_start)
+            top, height = self.sweep(y, h, dy, self.SLICE, self.slice_start)
+            slice_x = fx.reshape(len(fx), -1, self.SLICE)
+            slice_y = fy.reshape(len(fy), -1, self.SLICE)
+            all_x = slice_x.min(axis=(0, 2))
+            all_y = slice_y.min(axis=(0, 2))
+            ids, part = np.nonzero(rects_overlap(all_x, all_y, slice_x.max(axis=(0, 2)) + fighter.width - all_x,
+                                                 slice_y.max(axis=(0, 2)) + fighter.height - all_y,
+                                                 left, top, width, height))
+            if len(ids):
+                # Exact check over the slice each threat met it in: the
+                # frames it overlaps on each axis, as bits, for the three
+                # ways of moving along that axis, then for all nine moves
+                # the lowest bit both axes share
+                start = self.slice_start[part]
+                frames = start[:, None] + np.arange(self.SLICE)
+                tx = x[ids, None] + dx[ids, None] * frames - margin
+                ty = y[ids, None] + dy[ids, None] * frames - margin
+                at_x = fx.take(frames - 1, axis=1)
+                at_y = fy.take(frames - 1, axis=1)
+                over_x = (at_x < tx + (w[ids, None] + 2 * margin)) & (tx < at_x + fighter.width)
+                over_y = (at_y < ty + (h[ids, None] + 2 * margin)) & (ty < at_y + fighter.height)
+                both = (over_x.view(np.uint8) @ self.frame_bits)[:, None] & (over_y.view(np.uint8) @ self.frame_bits)
+                first_hit = np.minimum((start + self.lowest_bit.take(both)).min(axis=2), horizon + 1)
+        
+        # Latest first hit, then the shot line-up and height after one frame
+        first_hit = first_hit.ravel()
+        target = self.target(game)
+        center = fx[self.move_x + 1, 0] + fighter.width / 2
+        cost = np.abs(fy[self.move_y + 1, 0] - self.HOME_Y) / 2
+        if target is not None:
+            cost = cost + np.abs(center - target)
+        best = np.lexsort((cost, -first_hit))[0]
+        if game.pause_pressed:
+            game.pause_pressed = False
+            return self.buttons[best] | INPUT_PAUSE
+        return self.buttons[best]
+
+class Difficulty:
+    """Difficulty curve parameters; the defaults are the hand-tuned originals"""
+    DEFAULTS = {
+        'base_spawn_rate': 90,  # Frames between spawns: base - wave * step, at least min
+        'spawn_rate_step': 5,
+        'min_spawn_rate': 30,
+        'first_wave_size': 10,  # Kills needed to clear wave 1
+        'wave_size_step': 5,  # Extra kills needed by each later wave
+        'tank_wave': 3,  # First wave with tanks
+        'tank_chance': 0.2,
+        'fast_wave': 2,  # First wave with fast enemies
+        'fast_chance': 0.4,  # Chance of a fast or tank spawn, tanks drawn first
+        'bullet_damage': 15,
+        'collision_damage': 25
+    }
+    
+    def __init__(self, **params):
+        unknown = set(params) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"unknown difficulty parameters: {', '.join(sorted(unknown))}")
+        self.__dict__.update(self.DEFAULTS)
+        self.__dict__.update(params)
+    
+    def spawn_rate(self, wave):
+        return max(self.min_spawn_rate, self.base_spawn_rate - wave * self.spawn_rate_step)
+    
+    def wave_size(self, wave):
+        return self.first_wave_size + (wave - 1) * self.wave_size_step
+
+class Game:
+    def __init__(self, broadphase='grid', particle_cap=1024, dirty_rects=False,
+                 headless=False, render=True, seed=None, input_source=None, render_fps=FPS,
+                 profile=False, profile_csv=None, difficulty=None, record=None,
+                 palette=None, scale=1, event_log=None, quality=0, step_frames=1, pipeline=False,
+                 backend='surface', software_renderer=False, rewind_seconds=0,
+                 capture=None, capture_format='png', capture_workers=None):
+        # Frame capture workers are started before SDL sets up a window
+        self.capture = FrameCapture(capture, capture_format, capture_workers) if capture else None
+        
+        # Headless games never open a window; they draw to an off-screen
+        # surface if render is set and skip drawing entirely otherwise
+        self.headless = headless
+        if palette is None and backend == 'surface':
+            scale = 1  # Only the paletted frame and textures are upscaled
+        
+        # The texture backend draws through an SDL Renderer instead; the
+        # screen surface then only sets the format sprites are baked in
+        self.textures = None
+        if not headless and backend == 'texture':
+            pygame.display.init()
+            self.textures = TextureRenderer("CGA Fighter Jet - Enhanced Edition", scale, software_renderer)
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        elif not headless:
+            pygame.display.init()
+            self.display = pygame.display.set_mode((SCREEN_WIDTH * scale, SCREEN_HEIGHT * scale))
+            pygame.display.set_caption("CGA Fighter Jet - Enhanced Edition")
+            self.screen = self.display
+        elif render:
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            self.screen = None
+        
+        # Paletted rendering: draw into a CGA-resolution 8-bit canvas holding
+        # CGA_COLORS and expand it into the window through the named
+        # CGA_PALETTES entry when presenting. The shown view shares the
+        # canvas pixels but carries the displayed palette, so palette swaps
+        # and flashes are a palette write; it is converted to the window
+        # format at canvas size and scaled straight into the window.
+        self.palette = palette
+        self.scale = scale
+        self.shown_colors = None
+        self.shown = None
+        self.blank = None
+        self.flash_timer = 0
+        if palette is not None and self.screen is not None:
+            self.screen = pygame.Surface((SCREEN_WIDTH // PALETTE_PIXEL, SCREEN_HEIGHT // PALETTE_PIXEL), 0, 8)
+            self.screen.set_palette(self.palette_entries(CGA_COLORS))
+            self.blank = surface_like(self.screen, self.screen.get_size())  # SDL's 8-bit fills are slow
+            if not headless:
+                self.shown = self.screen.subsurface(self.screen.get_rect())
+                self.converted = pygame.Surface(self.screen.get_size(), 0, self.display)
+        self.clock = pygame.time.Clock()
+        self.render_fps = render_fps  # 0 renders as fast as possible
+        self.pipeline = pipeline  # run() simulates on a thread of its own
+        self.restart_pressed = False
+        self.skipped_frames = 0  # Steps run without a frame drawn for them
+        
+        # Phase timings; F3 toggles the overlay, profile_csv is written on exit
+        self.profiler = FrameProfiler(visible=not headless) if profile or profile_csv else NullProfiler()
+        self.profile_csv = profile_csv
+        
+        # Visual quality level, or 'auto' to trade it for frame time as needed
+        budget = 1 / render_fps if render_fps else SIM_DT
+        self.quality = (QualityGovernor(budget) if quality == 'auto'
+                        else QualityGovernor(budget, quality, adaptive=False))
+        
+        # Frames each step advances; above 1, collisions are swept so nothing
+        # tunnels through the longer moves, and recording is unavailable
+        if step_frames > 1 and record:
+            raise ValueError("can't record with multi-frame steps")
+        self.step_frames = step_frames
+        
+        # All game randomness comes from one seedable generator; recordings
+        # need a concrete seed to be replayable
+        if seed is None and record:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        if input_source is None:
+            input_source = ScriptedInput() if headless else KeyboardInput()
+        
+        # Recording covers the first game, up to the frame it ends on
+        self.recorder = InputRecorder(input_source, record, seed) if record else None
+        self.input_source = self.recorder or input_source
+        
+        # Save states of the last rewind_seconds, for Backspace to go back to
+        if rewind_seconds and record:
+            raise ValueError("can't record while rewinding")
+        self.rollback = Rollback(self.input_source, int(rewind_seconds * FPS)) if rewind_seconds else None
+        self.input_source = self.rollback or self.input_source
+        self.rewind_pressed = False
+        self.pause_pressed = False
+        self.frame = 0  # Steps simulated
+        self.difficulty = difficulty or Difficulty()
+        
+        # Event stream and persisted high score, written off the frame loop
+        self.events = EventLog(event_log) if event_log else NullEventLog()
+        self.events.emit('start', self.frame, seed=seed, time=time.time())
+        
+        # Game objects; self.fighter is the local player's, the first one
+        self.fighters = []
+        self.add_fighter()
+        self.enemy_bullets = EntityStore(Bullet)
+        self.enemies = EntityStore(Enemy, Enemy.COLUMNS, shared={'bullet_store': self.enemy_bullets})
+        self.power_ups = []
+        self.particles = ParticleSystem(particle_cap, self.rng)
+        # Stars are only generated when drawn, so they get their own generator
+        self.starfield = StarField(random.Random(seed))
+        self.sprites = SpriteCache()
+        
+        # Dirty-rect rendering: erase and present only what changed
+        self.dirty_rects = dirty_rects
+        self.drawn_rects = []
+        self.full_redraw = True
+        
+        # Collision broadphase: 'grid' (spatial hash) or 'brute' (every pair)
+        self.broadphase = broadphase
+        self.enemy_grid = SpatialHash()
+        self.bullet_grid = SpatialHash()
+        self.power_up_grid = SpatialHash()
+        
+        # Game state
+        self.enemy_spawn_timer = 0
+        self.powerup_spawn_timer = 0
+        self.score = 0
+        self.wave = 1
+        self.enemies_killed_this_wave = 0
+        self.enemies_per_wave = self.difficulty.first_wave_size
+        self.damage_taken = 0
+        
+        if self.screen is not None:
+            self.font = get_font(36)
+            self.small_font = get_font(24)
+            self.hud = HUD(self.font, self.small_font, antialias=self.screen.get_bitsize() > 8)
+        self.apply_quality()
+        
+        self.running = True
+        self.game_over = False
+        self.paused = False
+        
+        # High score
+        self.high_score = 0
+    
+    def spawn_enemy(self):
+        x = self.rng.randint(0, SCREEN_WIDTH - 20)
+        
+        # Difficulty increases with waves
+        difficulty = self.difficulty
+        rand = self.rng.random()
+        if self.wave >= difficulty.tank_wave and rand < difficulty.tank_chance:
+            enemy_type = 'tank'
+        elif self.wave >= difficulty.fast_wave and rand < difficulty.fast_chance:
+            enemy_type = 'fast'
+        else:
+            enemy_type = 'basic'
+        
+        enemy = Enemy(x, -20, enemy_type, self.enemy_bullets, self.rng)
+        self.enemies.append(enemy)
+    
+    def remove_enemy(self, enemy):
+        # An enemy's bullets disappear along with it
+        self.enemies.remove(enemy)
+        self.enemy_bullets.kill_owner(enemy.uid)
+    
+    def spawn_powerup(self):
+        x = self.rng.randint(20, SCREEN_WIDTH - 20)
+        power_type = self.rng.choice(['health', 'rapid_fire', 'shield'])
+        powerup = PowerUp(x, -12, power_type)
+        self.power_ups.append(powerup)
+    
+    def create_explosion(self, x, y, color=CGA_COLORS['WHITE']):
+        self.particles.emit(x, y, color, 15, self.quality.settings['explosion_particles'])
+    
+    def bullet_hit_enemy(self, bullets, b, e):
+        bullets.kill(b)
+        enemy = self.enemies.handle(e)
+        if enemy.take_damage():
+            self.remove_enemy(enemy)
+            self.score += 10 if enemy.type == 'basic' else (15 if enemy.type == 'fast' else 25)
+            self.enemies_killed_this_wave += 1
+            self.events.emit('kill', self.frame, enemy=enemy.type, score=self.score)
+            self.create_explosion(enemy.x + enemy.width // 2, 
+                                enemy.y + enemy.height // 2, 
+                                CGA_COLORS['MAGENTA'])
+    
+    def enemy_bullet_hit_fighter(self, fighter, b):
+        self.enemy_bullets.kill(b)
+        if fighter.take_damage(self.difficulty.bullet_damage):
+            self.damage_taken += self.difficulty.bullet_damage
+            self.flash_timer = DAMAGE_FLASH_FRAMES
+            self.events.emit('damage', self.frame, source='bullet', damage=self.difficulty.bullet_damage,
+                             health=fighter.health)
+            self.create_explosion(fighter.x + fighter.width // 2,
+                                fighter.y + fighter.height // 2,
+                                CGA_COLORS['CYAN'])
+        if self.all_down():
+            self.end_game()
+    
+    def enemy_hit_fighter(self, fighter, e):
+        enemy = self.enemies.handle(e)
+        self.remove_enemy(enemy)
+        if fighter.take_damage(self.difficulty.collision_damage):
+            self.damage_taken += self.difficulty.collision_damage
+            self.flash_timer = DAMAGE_FLASH_FRAMES
+            self.events.emit('damage', self.frame, source=enemy.type, damage=self.difficulty.collision_damage,
+                             health=fighter.health)
+            self.create_explosion(enemy.x + enemy.width // 2,
+                                enemy.y + enemy.height // 2,
+                                CGA_COLORS['MAGENTA'])
+        if self.all_down():
+            self.end_game()
+    
+    def collect_power_up(self, fighter, powerup):
+        fighter.activate_power_up(powerup.type)
+        self.score += 5
+        self.events.emit('power_up', self.frame, power_up=powerup.type, health=fighter.health)
+    
+    def all_down(self):
+        """True once every fighter is out of health, which ends the game"""
+        return all(fighter.health <= 0 for fighter in self.fighters)
+    
+    def flying(self):
+        """Fighters still in play"""
+        return [fighter for fighter in self.fighters if fighter.health > 0]
+    
+    def end_game(self):
+        if self.game_over:
+            return
+        self.game_over = True
+        self.high_score = max(self.high_score, self.score, self.events.high_score)
+        self.events.emit('game_over', self.frame, score=self.score, wave=self.wave,
+                         damage_taken=self.damage_taken, high_score=self.high_score)
+    
+    def check_collisions(self):
+        # Removed entities only lose their alive flag until the stores are
+        # compacted at the end, so slot order is stable throughout and both
+        # paths resolve hits in the same order
+        if self.step_frames > 1 and self.broadphase == 'grid':
+            self.check_collisions_swept_grid()
+        elif self.step_frames > 1:
+            self.check_collisions_swept()
+        elif self.broadphase == 'grid':
+            self.check_collisions_grid()
+        else:
+            self.check_collisions_brute()
+        
+        for fighter in self.fighters:
+            fighter.bullets.compact()
+        self.enemies.compact()
+        self.enemy_bullets.compact()
+    
+    def check_collisions_brute(self):
+        """Reference path: test every pair"""
+        # Check fighter bullets hitting enemies
+        enemies = self.enemies
+        enemy_rects = enemies.slot_rects()
+        for fighter in self.fighters:
+            bullets = fighter.bullets
+            for b, bullet_rect in enumerate(bullets.slot_rects()):
+                if not bullets.alive[b]:
+                    continue
+                for e, enemy_rect in enumerate(enemy_rects):
+                    if enemies.alive[e] and bullet_rect.colliderect(enemy_rect):
+                        self.bullet_hit_enemy(bullets, b, e)
+                        break
+        
+        for fighter in self.flying():
+            # Check enemy bullets hitting fighter
+            fighter_rect = pygame.Rect(fighter.x, fighter.y, fighter.width, fighter.height)
+            for b, bullet_rect in enumerate(self.enemy_bullets.slot_rects()):
+                if self.enemy_bullets.alive[b] and bullet_rect.colliderect(fighter_rect):
+                    self.enemy_bullet_hit_fighter(fighter, b)
+            
+            # Check enemies colliding with fighter
+            for e, enemy_rect in enumerate(enemies.slot_rects()):
+                if enemies.alive[e] and fighter_rect.colliderect(enemy_rect):
+                    self.enemy_hit_fighter(fighter, e)
+            
+            # Check power-up collection
+            for powerup in self.power_ups[:]:
+                powerup_rect = pygame.Rect(powerup.x, powerup.y, powerup.width, powerup.height)
+                if fighter_rect.colliderect(powerup_rect):
+                    self.power_ups.remove(powerup)
+                    self.collect_power_up(fighter, powerup)
+    
+    def check_collisions_grid(self):
+        """Spatial-hash path: only test pairs that share a grid cell"""
+        enemies = self.enemies
+        ex, ey, ew, eh = enemies.int_bounds()
+        self.enemy_grid.build(ex, ey, ew, eh, enemies.live())
+        
+        # Check fighter bullets hitting enemies; a bullet stops at the
+        # first live enemy it overlaps, as in the brute-force loop
+        for fighter in self.fighters:
+            bullets = fighter.bullets
+            bx, by, bw, bh = bullets.int_bounds()
+            b_ids, e_ids = self.enemy_grid.query(bx, by, bw, bh, bullets.live())
+            hits = rects_overlap(bx[b_ids], by[b_ids], bw[b_ids], bh[b_ids],
+                                 ex[e_ids], ey[e_ids], ew[e_ids], eh[e_ids])
+            for b, e in zip(b_ids[hits].tolist(), e_ids[hits].tolist()):
+                if bullets.alive[b] and enemies.alive[e]:
+                    self.bullet_hit_enemy(bullets, b, e)
+        
+        bx, by, bw, bh = self.enemy_bullets.int_bounds()
+        self.bullet_grid.build(bx, by, bw, bh, self.enemy_bullets.live())
+        for fighter in self.flying():
+            # Check enemy bullets hitting fighter
+            fx, fy, fw, fh = (np.array([int(value)], np.int64) for value in
+                              (fighter.x, fighter.y, fighter.width, fighter.height))
+            _, b_ids = self.bullet_grid.query(fx, fy, fw, fh)
+            hits = rects_overlap(fx, fy, fw, fh, bx[b_ids], by[b_ids], bw[b_ids], bh[b_ids])
+            for b in b_ids[hits].tolist():
+                if self.enemy_bullets.alive[b]:
+                    self.enemy_bullet_hit_fighter(fighter, b)
+            
+            # Check enemies colliding with fighter
+            _, e_ids = self.enemy_grid.query(fx, fy, fw, fh)
+            hits = rects_overlap(fx, fy, fw, fh, ex[e_ids], ey[e_ids], ew[e_ids], eh[e_ids])
+            for e in e_ids[hits].tolist():
+                if enemies.alive[e]:
+                    self.enemy_hit_fighter(fighter, e)
+            
+            # Check power-up collection
+            if self.power_ups:
+                px, py, pw, ph = (np.array(values, np.int64) for values in
+                                  zip(*[(int(p.x), int(p.y), p.width, p.height) for p in self.power_ups]))
+                self.power_up_grid.build(px, py, pw, ph)
+                _, p_ids = self.power_up_grid.query(fx, fy, fw, fh)
+                taken = p_ids[rects_overlap(fx, fy, fw, fh, px[p_ids], py[p_ids], pw[p_ids], ph[p_ids])].tolist()
+                if taken:
+                    collected = [self.power_ups[p] for p in taken]
+                    self.power_ups = [p for p in self.power_ups if p not in collected]
+                    for powerup in collected:
+                        self.collect_power_up(fighter, powerup)
+    
+    def check_collisions_swept(self):
+        """Multi-frame step reference path: boxes are swept along their motion
+        over the step, every pair is tested and each kind of hit is resolved
+        in time-of-impact order"""
+        # Check fighter bullets hitting enemies; a bullet stops at the
+        # first live enemy in its way
+        enemies = self.enemies
+        for fighter in self.fighters:
+            bullets = fighter.bullets
+            b_live = bullets.live()
+            e_live = enemies.live()
+            toi = swept_toi(*bullets.sweep(b_live[:, None]), *enemies.sweep(e_live[None, :]))
+            b_ids, e_ids = np.nonzero(np.isfinite(toi))
+            order = np.argsort(toi[b_ids, e_ids], kind='stable')
+            for b, e in zip(b_live[b_ids[order]].tolist(), e_live[e_ids[order]].tolist()):
+                if bullets.alive[b] and enemies.alive[e]:
+                    self.bullet_hit_enemy(bullets, b, e)
+        
+        for fighter in self.flying():
+            fighter_sweep = (fighter.prev_x, fighter.prev_y, fighter.x - fighter.prev_x,
+                             fighter.y - fighter.prev_y, fighter.width, fighter.height)
+            
+            # Check enemy bullets hitting fighter
+            b_live = self.enemy_bullets.live()
+            toi = swept_toi(*self.enemy_bullets.sweep(b_live), *fighter_sweep)
+            hits = np.flatnonzero(np.isfinite(toi))
+            for b in b_live[hits[np.argsort(toi[hits], kind='stable')]].tolist():
+                if self.enemy_bullets.alive[b]:
+                    self.enemy_bullet_hit_fighter(fighter, b)
+            
+            # Check enemies colliding with fighter
+            e_live = enemies.live()
+            toi = swept_toi(*enemies.sweep(e_live), *fighter_sweep)
+            hits = np.flatnonzero(np.isfinite(toi))
+            for e in e_live[hits[np.argsort(toi[hits], kind='stable')]].tolist():
+                if enemies.alive[e]:
+                    self.enemy_hit_fighter(fighter, e)
+            
+            # Check power-up collection
+            for powerup in self.power_ups[:]:
+                if np.isfinite(swept_toi(powerup.x, powerup.prev_y, 0, powerup.y - powerup.prev_y,
+                                         powerup.width, powerup.height, *fighter_sweep)):
+                    self.power_ups.remove(powerup)
+                    self.collect_power_up(fighter, powerup)
+    
+    def check_collisions_swept_grid(self):
+        """Multi-frame step spatial-hash path: the box each entity sweeps over
+        the step is hashed, and only pairs sharing a cell get a time of impact"""
+        enemies = self.enemies
+        ex, ey, ew, eh = enemies.swept_bounds()
+        self.enemy_grid.build(ex, ey, ew, eh, enemies.live())
+        
+        # Check fighter bullets hitting enemies; candidate pairs come sorted
+        # like the reference path's, so equal times resolve the same way
+        for fighter in self.fighters:
+            bullets = fighter.bullets
+            b_ids, e_ids = self.enemy_grid.query(*bullets.swept_bounds(), bullets.live())
+            toi = swept_toi(*bullets.sweep(b_ids), *enemies.sweep(e_ids))
+            hits = np.flatnonzero(np.isfinite(toi))
+            order = hits[np.argsort(toi[hits], kind='stable')]
+            for b, e in zip(b_ids[order].tolist(), e_ids[order].tolist()):
+                if bullets.alive[b] and enemies.alive[e]:
+                    self.bullet_hit_enemy(bullets, b, e)
+        
+        self.bullet_grid.build(*self.enemy_bullets.swept_bounds(), self.enemy_bullets.live())
+        for fighter in self.flying():
+            fighter_sweep = (fighter.prev_x, fighter.prev_y, fighter.x - fighter.prev_x,
+                             fighter.y - fighter.prev_y, fighter.width, fighter.height)
+            left, top = math.floor(min(fighter.prev_x, fighter.x)), math.floor(min(fighter.prev_y, fighter.y))
+            fx, fy, fw, fh = (np.array([value], np.int64) for value in (
+                left, top, math.ceil(max(fighter.prev_x, fighter.x) + fighter.width) - left,
+                math.ceil(max(fighter.prev_y, fighter.y) + fighter.height) - top))
+            
+            # Check enemy bullets hitting fighter
+            _, b_ids = self.bullet_grid.query(fx, fy, fw, fh)
+            toi = swept_toi(*self.enemy_bullets.sweep(b_ids), *fighter_sweep)
+            hits = np.flatnonzero(np.isfinite(toi))
+            for b in b_ids[hits[np.argsort(toi[hits], kind='stable')]].tolist():
+                if self.enemy_bullets.alive[b]:
+                    self.enemy_bullet_hit_fighter(fighter, b)
+            
+            # Check enemies colliding with fighter
+            _, e_ids = self.enemy_grid.query(fx, fy, fw, fh)
+            toi = swept_toi(*enemies.sweep(e_ids), *fighter_sweep)
+            hits = np.flatnonzero(np.isfinite(toi))
+            for e in e_ids[hits[np.argsort(toi[hits], kind='stable')]].tolist():
+                if enemies.alive[e]:
+                    self.enemy_hit_fighter(fighter, e)
+            
+            # Check power-up collection; there are only ever a few
+            for powerup in self.power_ups[:]:
+                if np.isfinite(swept_toi(powerup.x, powerup.prev_y, 0, powerup.y - powerup.prev_y,
+                                         powerup.width, powerup.height, *fighter_sweep)):
+                    self.power_ups.remove(powerup)
+                    self.collect_power_up(fighter, powerup)
+    
+    def handle_input(self):
+        # A bitmask steers the first fighter; a list has one per fighter
+        buttons = self.input_source.poll(self)
+        if isinstance(buttons, int):
+            buttons = [buttons]
+        if any(pressed & INPUT_PAUSE for pressed in buttons):
+            self.paused = not self.paused
+        if self.paused:
+            return
+        for fighter, pressed in zip(self.fighters, buttons):
+            if fighter.health <= 0:
+                continue
+            dx, dy = 0, 0
+            
+            if pressed & INPUT_LEFT:
+                dx = -1
+            if pressed & INPUT_RIGHT:
+                dx = 1
+            if pressed & INPUT_UP:
+                dy = -1
+            if pressed & INPUT_DOWN:
+                dy = 1
+            
+            fighter.move(dx * self.step_frames, dy * self.step_frames)
+            
+            if pressed & INPUT_FIRE:
+                fighter.shoot(self.step_frames)
+    
+    def update(self):
+        if self.paused or self.game_over:
+            return
+        
+        # Update starfield
+        frames = self.step_frames
+        if not self.pipeline:
+            # Pipelined, the render thread scrolls the stars itself
+            self.starfield.update(frames)
+        self.profiler.mark('starfield')
+        
+        # Check for wave completion
+        if self.enemies_killed_this_wave >= self.enemies_per_wave and len(self.enemies) == 0:
+            self.wave += 1
+            self.enemies_killed_this_wave = 0
+            self.enemies_per_wave += self.difficulty.wave_size_step
+            self.score += 50  # Wave completion bonus
+            self.events.emit('wave', self.frame, wave=self.wave, score=self.score)
+        
+        # Spawn enemies (faster spawning as waves progress). The timers keep
+        # the frames a multi-frame step ran past the threshold, but never
+        # more than one step's worth (the enemy timer keeps counting while
+        # a wave's spawns are used up)
+        self.enemy_spawn_timer += frames
+        spawn_rate = self.difficulty.spawn_rate(self.wave)
+        if self.enemy_spawn_timer > spawn_rate and self.enemies_killed_this_wave < self.enemies_per_wave:
+            self.spawn_enemy()
+            self.enemy_spawn_timer = min(self.enemy_spawn_timer - spawn_rate - 1, frames - 1)
+        
+        # Spawn power-ups occasionally
+        self.powerup_spawn_timer += frames
+        if self.powerup_spawn_timer > 600:  # Every 10 seconds
+            if self.rng.random() < 0.5:
+                self.spawn_powerup()
+            self.powerup_spawn_timer -= 601
+        self.profiler.mark('spawn')
+        
+        # Update game objects
+        for fighter in self.fighters:
+            fighter.update(frames)
+        self.profiler.mark('fighter')
+        
+        Enemy.update_all(self.enemies, self.enemy_bullets, self.rng, frames)
+        for slot in np.flatnonzero(self.enemies.y[:self.enemies.count] > SCREEN_HEIGHT).tolist():
+            self.remove_enemy(self.enemies.handle(slot))
+        self.enemies.compact()
+        self.enemy_bullets.compact()
+        self.profiler.mark('enemies')
+        
+        for powerup in self.power_ups[:]:
+            powerup.update(frames)
+            if powerup.y > SCREEN_HEIGHT:
+                self.power_ups.remove(powerup)
+        self.profiler.mark('power_ups')
+        
+        self.particles.update(frames)
+        self.profiler.mark('particles')
+        
+        # Check collisions
+        self.check_collisions()
+        self.profiler.mark('collisions')
+        
+        # Update high score
+        if self.score > self.high_score:
+            self.high_score = self.score
+    
+    def draw(self, alpha=1.0):
+        """Draw the frame, alpha of the way from the previous step to the current one"""
+        self.render(DrawState(self, alpha))
+    
+    def render(self, state):
+        """Draw and show a captured DrawState"""
+        if self.textures is not None:
+            self.textures.render(self, state)
+            return
+        alpha = state.alpha
+        if self.dirty_rects and not self.full_redraw:
+            # Erase only what was drawn last frame
+            for rect in self.drawn_rects:
+                self.screen.fill(CGA_COLORS['BLACK'], rect)
+        elif self.blank is not None:
+            self.screen.blit(self.blank, (0, 0))
+        else:
+            # Fill screen with black
+            self.screen.fill(CGA_COLORS['BLACK'])
+        
+        # Draw starfield
+        drawn = self.starfield.draw(self.screen, alpha, self.dirty_rects)
+        
+        screen = self.screen
+        if not state.game_over:
+            # Draw particles first (behind everything)
+            drawn += state.particles.draw(screen, alpha)
+            
+            # Draw game objects, one batched layer at a time
+            drawn += self.sprites.draw(screen, state.fighter_sprites)
+            drawn += [screen.fill(CGA_COLORS['CYAN'], rect) for rect in state.bullets]
+            drawn += self.sprites.draw(screen, state.enemy_sprites)
+            drawn += [screen.fill(CGA_COLORS['MAGENTA'], rect) for rect in state.enemy_bullets]
+            drawn += self.sprites.draw(screen, state.power_up_sprites)
+            
+            # Draw UI
+            drawn += self.hud.draw(screen, state)
+        else:
+            # Draw particles
+            drawn += state.particles.draw(screen, alpha)
+            
+            # Game Over screen
+            drawn += self.hud.draw_game_over(screen, state)
+        
+        if self.profiler.visible:
+            drawn += self.profiler.draw(self.screen, get_font(24 // pixel_size(self.screen)))
+        
+        self.present(drawn)
+        if self.capture is not None:
+            self.grab_frame()
+    
+    def grab_frame(self):
+        """Hand the frame just presented to the capture workers"""
+        colors = None
+        if self.palette is not None:
+            self.update_palette()
+            colors = [self.shown_colors[name] for name in CGA_COLORS]
+        self.capture.grab(self.screen, colors)
+    
+    def present(self, drawn):
+        """Show the frame, updating only changed regions in dirty-rect mode"""
+        if self.headless:
+            return
+        recolored = self.palette is not None and self.update_palette()
+        if not self.dirty_rects:
+            self.upscale()
+            pygame.display.flip()
+            return
+        
+        # Pixels can only have changed where something was drawn last
+        # frame (now erased) or this frame
+        dirty = self.drawn_rects + drawn
+        self.drawn_rects = drawn
+        dirty_area = sum(rect.width * rect.height for rect in dirty)
+        width, height = self.screen.get_size()
+        if self.full_redraw or recolored or dirty_area > DIRTY_FLIP_THRESHOLD * width * height:
+            self.upscale()
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.upscale(dirty))
+    
+    @staticmethod
+    def palette_entries(colors):
+        # Unused entries repeat black so color matching never picks them
+        return [colors[name] for name in CGA_COLORS] + [colors['BLACK']] * (256 - len(CGA_COLORS))
+    
+    def update_palette(self):
+        """Pick up palette switches and damage flashes; True if the colors changed"""
+        colors = CGA_PALETTES[self.palette]
+        if self.flash_timer > 0:
+            colors = dict(colors, BLACK=DAMAGE_FLASH_COLOR)
+        if colors == self.shown_colors:
+            return False
+        self.shown_colors = colors
+        if self.shown is not None:
+            self.shown.set_palette(self.palette_entries(colors))
+        return True
+    
+    def upscale(self, rects=None):
+        """Expand the paletted canvas (or just rects of it) into the window
+        
+        Each area is converted through the shown palette at canvas size and
+        scaled into the window in one go. Returns the window rects written;
+        without a paletted canvas the screen is the window and rects pass
+        through unchanged.
+        """
+        if self.palette is None:
+            return rects
+        factor = self.display.get_width() // self.screen.get_width()
+        bounds = self.screen.get_rect()
+        shown = []
+        for rect in [bounds] if rects is None else rects:
+            rect = rect.clip(bounds)
+            if rect.width and rect.height:
+                target = pygame.Rect(rect.x * factor, rect.y * factor, rect.width * factor, rect.height * factor)
+                self.converted.blit(self.shown, rect, rect)
+                pygame.transform.scale(self.converted.subsurface(rect), target.size, self.display.subsurface(target))
+                shown.append(target)
+        return None if rects is None else shown
+    
+    def cycle_palette(self):
+        names = list(CGA_PALETTES)
+        self.palette = names[(names.index(self.palette) + 1) % len(names)]
+    
+    def add_fighter(self, index=None):
+        """Put a fresh fighter in play at index, by default after the others,
+        and return the index; each one starts beside the one before"""
+        if index is None:
+            index = len(self.fighters)
+            self.fighters.append(None)
+        self.fighters[index] = Fighter(SCREEN_WIDTH // 2 + 40 * index, SCREEN_HEIGHT - 50)
+        self.fighter = self.fighters[0]
+        return index
+    
+    def restart(self):
+        players = len(self.fighters)
+        self.fighters = []
+        for _ in range(players):
+            self.add_fighter()
+        self.enemy_bullets = EntityStore(Bullet)
+        self.enemies = EntityStore(Enemy, Enemy.COLUMNS, shared={'bullet_store': self.enemy_bullets})
+        self.power_ups = []
+        self.particles.clear()
+        self.enemy_spawn_timer = 0
+        self.powerup_spawn_timer = 0
+        self.score = 0
+        self.wave = 1
+        self.enemies_killed_this_wave = 0
+        self.enemies_per_wave = self.difficulty.first_wave_size
+        self.damage_taken = 0
+        self.flash_timer = 0
+        self.game_over = False
+        self.paused = False
+        self.events.emit('start', self.frame, seed=None, time=time.time())
+    
+    def run(self, frames=None, stop_on_game_over=False):
+        """Fixed-timestep loop: simulate at FPS, render at render_fps
+        
+        Real time accumulates and is consumed in SIM_DT steps, at most
+        MAX_FRAME_SKIP per rendered frame; beyond that the backlog is dropped
+        and the game slows down instead of spiralling. Frames are drawn
+        interpolated by however far the accumulator is into the next step.
+        The loop ends early after frames steps or at game over if asked to.
+        """
+        if frames is not None and self.frame >= frames:
+            self.running = False
+        if self.pipeline:
+            return self.run_pipelined(frames, stop_on_game_over)
+        accumulator = 0.0
+        previous = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            self.profiler.begin_frame()
+            
+            for event in pygame.event.get():
+                self.handle_event(event)
+            self.apply_presses()
+            self.profiler.mark('events')
+            
+            steps = 0
+            while accumulator >= SIM_DT and steps < MAX_FRAME_SKIP:
+                self.step()
+                accumulator -= SIM_DT
+                steps += 1
+                if (frames is not None and self.frame >= frames) or (self.game_over and stop_on_game_over):
+                    self.running = False
+                    break
+            if steps == MAX_FRAME_SKIP:
+                accumulator = min(accumulator, SIM_DT)
+            self.skipped_frames += max(0, steps - 1)
+            
+            self.draw(accumulator / SIM_DT)
+            self.profiler.mark('draw')
+            self.profiler.end_frame(self)
+            if self.quality.update(time.perf_counter() - now, self.frame):
+                self.apply_quality()
+            self.clock.tick(self.render_fps)
+        self.shutdown()
+    
+    def handle_event(self, event):
+        """React to one window event; restart and rewind presses wait for
+        apply_presses() on whichever thread steps the simulation"""
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.VIDEOEXPOSE:
+            self.full_redraw = True
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3:
+                self.toggle_profiler()
+            elif event.key == pygame.K_F2 and self.palette is not None:
+                self.cycle_palette()
+            elif event.key == pygame.K_BACKSPACE and self.rollback:
+                self.rewind_pressed = True
+            elif self.game_over:
+                if event.key == pygame.K_r:
+                    self.restart_pressed = True
+                elif event.key == pygame.K_q:
+                    self.running = False
+            elif event.key in (pygame.K_p, pygame.K_ESCAPE):
+                self.pause_pressed = True
+    
+    def apply_presses(self):
+        """Carry out restart and rewind presses before the next step"""
+        if self.restart_pressed:
+            self.restart_pressed = False
+            self.restart()
+        if self.rewind_pressed:
+            self.rewind_pressed = False
+            self.rewind(FPS // self.step_frames)
+    
+    def shutdown(self):
+        """Write out and close whatever the run opened, then quit"""
+        if self.profile_csv and self.profiler.enabled:
+            self.profiler.write_csv(self.profile_csv)
+        if self.recorder:
+            self.recorder.close()
+        self.events.close()
+        if self.capture is not None:
+            self.capture.close()
+        pygame.quit()
+        sys.exit()
+    
+    def run_pipelined(self, frames=None, stop_on_game_over=False):
+        """run() with the simulation on a thread of its own
+        
+        The simulation thread steps at FPS and publishes a DrawState after
+        each step; this thread handles events and renders the newest state
+        at render_fps, so pygame's blitting and flipping, which release the
+        GIL, overlap with simulating. Rendering stays on the main thread
+        because SDL expects window calls there. The profiler times this
+        thread's frames; marks from the simulation thread are not recorded.
+        """
+        buffer = TripleBuffer(DrawState(self, copy=True))
+        simulation = threading.Thread(target=self.simulate_paced, args=(buffer, frames, stop_on_game_over),
+                                      name='simulation', daemon=True)
+        simulation.start()
+        shown = self.frame
+        while self.running:
+            start = time.perf_counter()
+            self.profiler.begin_frame()
+            for event in pygame.event.get():
+                self.handle_event(event)
+            self.profiler.mark('events')
+            
+            state, fresh = buffer.latest()
+            if fresh:
+                self.starfield.update(state.frame - shown)
+                shown = state.frame
+                self.render(state)
+            self.profiler.mark('draw')
+            self.profiler.end_frame(self)
+            if self.quality.update(time.perf_counter() - start, shown):
+                self.apply_quality()
+            self.clock.tick(self.render_fps)
+        simulation.join()
+        self.skipped_frames = buffer.dropped
+        self.shutdown()
+    
+    def simulate_paced(self, buffer, frames=None, stop_on_game_over=False):
+        """Simulation thread of run_pipelined: step in real time and publish"""
+        pacer = Pacer()
+        while self.running:
+            self.apply_presses()
+            self.step()
+            buffer.publish(DrawState(self, copy=True))
+            if (frames is not None and self.frame >= frames) or (self.game_over and stop_on_game_over):
+                self.running = False
+            pacer.wait()
+    
+    def rewind(self, steps):
+        """Go back up to steps steps, as far as the rollback history reaches"""
+        self.rollback.rewind(self, steps)
+        self.full_redraw = True
+        self.events.emit('rewind', self.frame, score=self.score)
+    
+    def apply_quality(self):
+        """Pass the current quality settings on to what doesn't read them per frame"""
+        settings = self.quality.settings
+        self.starfield.set_density(settings['star_density'])
+        if self.screen is not None:
+            self.hud.interval = settings['hud_interval']
+    
+    def toggle_profiler(self):
+        """Show or hide the profiler overlay, starting to record on first use"""
+        if not self.profiler.enabled:
+            self.profiler = FrameProfiler()
+        self.profiler.visible = not self.profiler.visible
+        self.full_redraw = True
+    
+    def save_positions(self):
+        for fighter in self.fighters:
+            fighter.prev_x = fighter.x
+            fighter.prev_y = fighter.y
+            fighter.bullets.save_positions()
+        self.enemies.save_positions()
+        self.enemy_bullets.save_positions()
+        for powerup in self.power_ups:
+            powerup.prev_y = powerup.y
+        self.particles.save_positions()
+    
+    def step(self):
+        """Advance the simulation by one frame"""
+        self.save_positions()
+        if not self.game_over:
+            self.handle_input()
+        self.profiler.mark('input')
+        
+        self.update()
+        self.frame += self.step_frames
+        self.flash_timer = max(0, self.flash_timer - self.step_frames)
+        if self.game_over and self.recorder:
+            self.recorder.close()
+    
+    def simulate(self, frames, stop_on_game_over=True):
+        """Run up to frames frames as fast as possible; returns frames run
+        
+        Draws each step to the off-screen surface when rendering is on.
+        """
+        played = 0
+        while played < frames:
+            self.profiler.begin_frame()
+            self.step()
+            played += self.step_frames
+            if self.screen is not None:
+                self.draw()
+                self.profiler.mark('draw')
+            self.profiler.end_frame(self)
+            if self.game_over and stop_on_game_over:
+                break
+        return played
+
+class SnapshotCodec:
+    """Quantized game state snapshots, delta-compressed against a base
+    
+    A state maps each section name to {id: record}, a record being a tuple
+    of small ints with positions in 1/QUANTUM pixel steps. Fighters are
+    keyed by their index in the game, and their bullets by serial and
+    fighter index. encode() only writes what differs from a base state the
+    receiver already holds: the removed ids, then each new or changed
+    record as its id, a bitmask of the fields that changed and those
+    fields. cap() keeps full snapshots, and so every delta, within one
+    datagram.
+    """
+    QUANTUM = 4  # Position steps per pixel
+    SNAPSHOT = 1
+    MAX_FIGHTERS = 4
+    MAX_FULL = 32000  # Bytes; a delta adds at most 4 per record removed
+    # kind, seq, base seq (0 for none), last input applied, the receiver's
+    # fighter, frame, score, high score, wave, kills this wave, wave size, flags
+    HEADER = struct.Struct('<BIIIBIIIHHHB')
+    GAME_OVER = 1
+    PAUSED = 2
+    # Section name, field formats, index of the x field (y follows it)
+    SECTIONS = (
+        ('fighters', 'hhhBBB', 0),  # x, y, health, shield/invincible/rapid-fire timers
+        ('enemies', 'Bhh', 1),  # type, x, y
+        ('bullets', 'hh', 0),
+        ('enemy_bullets', 'hh', 0),
+        ('power_ups', 'Bhh', 1)  # type, x, y
+    )
+    COUNT = struct.Struct('<H')
+    RECORD = struct.Struct('<IB')
+    FIELDS = {name: [struct.Struct('<' + field) for field in fields] for name, fields, _ in SECTIONS}
+    KEEP = ('fighters', 'power_ups', 'enemies', 'enemy_bullets', 'bullets')  # What cap() keeps first
+    
+    @classmethod
+    def quantize(cls, values):
+        return np.clip(np.rint(values * cls.QUANTUM), -32768, 32767).astype(int).tolist()
+    
+    @classmethod
+    def capture(cls, game):
+        """(info, state) of a game as the server would send it"""
+        fighters = {}
+        bullets = {}
+        for index, fighter in enumerate(game.fighters):
+            x, y = cls.quantize(np.array([fighter.x, fighter.y]))
+            fighters[index] = (x, y, max(-32768, fighter.health), min(fighter.shield_timer, 255),
+                               min(fighter.invincible_timer, 255), min(fighter.rapid_fire_timer, 255))
+            bullets.update(cls.capture_bullets(fighter.bullets, index))
+        
+        enemies = game.enemies
+        live = enemies.live()
+        state = {
+            'fighters': fighters,
+            'enemies': dict(zip(enemies.owner[live].tolist(),
+                                zip(enemies.kind[live].tolist(), cls.quantize(enemies.x[live]), cls.quantize(enemies.y[live])))),
+            'bullets': bullets,
+            'enemy_bullets': cls.capture_bullets(game.enemy_bullets),
+            'power_ups': {powerup.uid: (POWER_UP_TYPES.index(powerup.type),
+                                        *cls.quantize(np.array([powerup.x, powerup.y])))
+                          for powerup in game.power_ups}
+        }
+        flags = (cls.GAME_OVER if game.game_over else 0) | (cls.PAUSED if game.paused else 0)
+        info = (game.frame, game.score, game.high_score, game.wave,
+                game.enemies_killed_this_wave, game.enemies_per_wave, flags)
+        return info, state
+    
+    @classmethod
+    def capture_bullets(cls, store, index=0):
+        live = store.live()
+        keys = (store.serial[live].astype(np.int64) * cls.MAX_FIGHTERS + index) & 0xFFFFFFFF
+        return dict(zip(keys.tolist(), zip(cls.quantize(store.x[live]), cls.quantize(store.y[live]))))
+    
+    @classmethod
+    def cap(cls, state):
+        """Leave out the records that would take a full encoding of state
+        past MAX_FULL bytes, from the end of KEEP back; returns how many"""
+        room = cls.MAX_FULL - cls.HEADER.size - 2 * cls.COUNT.size * len(cls.SECTIONS)
+        left_out = 0
+        for name in cls.KEEP:
+            records = state[name]
+            size = cls.RECORD.size + sum(field.size for field in cls.FIELDS[name])
+            fits = max(0, room // size)
+            if len(records) > fits:
+                left_out += len(records) - fits
+                state[name] = dict(itertools.islice(records.items(), fits))
+            room -= size * len(state[name])
+        return left_out
+    
+    @classmethod
+    def encode(cls, seq, base_seq, input_seq, you, info, state, base=None):
+        out = [cls.HEADER.pack(cls.SNAPSHOT, seq, base_seq, input_seq, you, *info)]
+        for name, _, _ in cls.SECTIONS:
+            records = state[name]
+            old = base[name] if base else {}
+            removed = [key for key in old if key not in records]
+            out.append(struct.pack(f'<H{len(removed)}I', len(removed), *removed))
+            
+            changed = []
+            fields = cls.FIELDS[name]
+            for key, record in records.items():
+                previous = old.get(key)
+                if record == previous:
+                    continue
+                mask = 0
+                packed = []
+                for i, value in enumerate(record):
+                    if previous is None or previous[i] != value:
+                        mask |= 1 << i
+                        packed.append(fields[i].pack(value))
+                changed.append(cls.RECORD.pack(key, mask) + b''.join(packed))
+            out.append(cls.COUNT.pack(len(changed)))
+            out += changed
+        return b''.join(out)
+    
+    @classmethod
+    def header(cls, data):
+        """(seq, base seq, input seq, receiver's fighter, info) of an encoded snapshot"""
+        kind, seq, base_seq, input_seq, you, *info = cls.HEADER.unpack_from(data)
+        return seq, base_seq, input_seq, you, tuple(info)
+    
+    @classmethod
+    def decode(cls, data, base=None):
+        """State encoded in data, given the base it was encoded against"""
+        offset = cls.HEADER.size
+        state = {}
+        for name, _, _ in cls.SECTIONS:
+            records = dict(base[name]) if base else {}
+            count, = cls.COUNT.unpack_from(data, offset)
+            offset += cls.COUNT.size
+            for key in struct.unpack_from(f'<{count}I', data, offset):
+                del records[key]
+            offset += 4 * count
+            
+            fields = cls.FIELDS[name]
+            count, = cls.COUNT.unpack_from(data, offset)
+            offset += cls.COUNT.size
+            for _ in range(count):
+                key, mask = cls.RECORD.unpack_from(data, offset)
+                offset += cls.RECORD.size
+                record = list(records.get(key, (0,) * len(fields)))
+                for i, field in enumerate(fields):
+                    if mask >> i & 1:
+                        record[i], = field.unpack_from(data, offset)
+                        offset += field.size
+                records[key] = tuple(record)
+            state[name] = records
+        return state
+    
+    @classmethod
+    def blend(cls, old, new, t):
+        """new with positions moved back towards old by 1 - t; records only in new are kept as is"""
+        state = {}
+        for name, _, index in cls.SECTIONS:
+            before = old[name]
+            records = {}
+            for key, record in new[name].items():
+                previous = before.get(key)
+                if previous is not None:
+                    record = list(record)
+                    for i in (index, index + 1):
+                        record[i] = interpolate(previous[i], record[i], t)
+                records[key] = record
+            state[name] = records
+        return state
+    
+    @classmethod
+    def show(cls, game, info, state, you=0):
+        """Load a snapshot into a game used purely as a view, ready to draw,
+        with fighter you as the game's own"""
+        (game.frame, game.score, game.high_score, game.wave,
+         game.enemies_killed_this_wave, game.enemies_per_wave, flags) = info
+        game.game_over = bool(flags & cls.GAME_OVER)
+        game.paused = bool(flags & cls.PAUSED)
+        q = cls.QUANTUM
+        
+        while len(game.fighters) < len(state['fighters']):
+            game.add_fighter()
+        for index, fighter in enumerate(game.fighters):
+            record = state['fighters'].get(index, (0, 0, 0, 0, 0, 0))
+            x, y, fighter.health, fighter.shield_timer, fighter.invincible_timer, fighter.rapid_fire_timer = record
+            fighter.x = fighter.prev_x = x / q
+            fighter.y = fighter.prev_y = y / q
+            fighter.bullets.clear()
+        game.fighter = game.fighters[you] if you < len(game.fighters) else game.fighters[0]
+        
+        game.enemies.clear()
+        for kind, x, y in state['enemies'].values():
+            game.enemies.append(Enemy(x / q, y / q, ENEMY_TYPES[kind], game.enemy_bullets, game.rng))
+        for key, (x, y) in state['bullets'].items():
+            fighter = game.fighters[min(key % cls.MAX_FIGHTERS, len(game.fighters) - 1)]
+            Bullet.fire(fighter.bullets, x / q, y / q, 0, 0)
+        game.enemy_bullets.clear()
+        for x, y in state['enemy_bullets'].values():
+            Bullet.fire(game.enemy_bullets, x / q, y / q, 0, 0, -1)
+        game.power_ups = [PowerUp(x / q, y / q, POWER_UP_TYPES[kind]) for kind, x, y in state['power_ups'].values()]
+
+class LossyLink:
+    """Sending side of a UDP socket with simulated latency, jitter and loss
+    
+    Each packet is dropped with probability loss, or held back for latency
+    plus up to jitter seconds and sent by the first flush() after that.
+    With all three at zero packets go straight out. Send errors are counted
+    by errno and the first of each kind is logged.
+    """
+    
+    def __init__(self, sock, latency=0.0, jitter=0.0, loss=0.0, seed=None, log=print):
+        self.sock = sock
+        self.log = log
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.queue = []
+        self.packets = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.errors = {}
+    
+    def send(self, data, address, now):
+        self.packets += 1
+        self.bytes += len(data)
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+        elif self.latency or self.jitter:
+            due = now + self.latency + self.rng.uniform(0, self.jitter)
+            heapq.heappush(self.queue, (due, self.packets, data, address))
+        else:
+            self.sendto(data, address)
+    
+    def flush(self, now):
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, address = heapq.heappop(self.queue)
+            self.sendto(data, address)
+    
+    def sendto(self, data, address):
+        try:
+            self.sock.sendto(data, address)
+        except OSError as e:
+            # Peer gone, buffer full or packet too big: the packet is lost
+            # like any other, but say why the first time
+            if e.errno not in self.errors:
+                self.log(f"Sending {len(data)} bytes to {address[0]}:{address[1]} failed: {e}")
+            self.errors[e.errno] = self.errors.get(e.errno, 0) + 1
+    
+    def receive(self, size=65536):
+        """Every (data, address) waiting on the socket"""
+        packets = []
+        while True:
+            try:
+                packets.append(self.sock.recvfrom(size))
+            except (BlockingIOError, ConnectionError):
+                return packets
+
+NET_PORT = 50007
+NET_HELLO = 2
+NET_INPUT = 3
+NET_BYE = 4
+NET_INPUT_PACKET = struct.Struct('<BIBI')  # kind, input seq, buttons, last snapshot seq decoded
+
+class NetServer:
+    """Authoritative real-time game for NetClients over UDP
+    
+    The simulation only runs here, at FPS, while clients are connected. Up
+    to MAX_CLIENTS each fly their own fighter, the lowest index free when
+    they joined; a client's fighter drops out of play when it leaves. Pause
+    and restart presses are kept until the next step uses them. Every
+    snapshot_rate-th of a second each client gets a snapshot encoded
+    against the last one it acknowledged, or a full one if that has already
+    left the history.
+    """
+    MAX_CLIENTS = 2  # At most SnapshotCodec.MAX_FIGHTERS
+    HISTORY = 64  # Snapshots kept as delta bases
+    TIMEOUT = 5.0  # Seconds of silence before a client is dropped
+    PRESSES = INPUT_PAUSE | INPUT_RESTART
+    
+    def __init__(self, port=NET_PORT, seed=None, snapshot_rate=30, latency=0.0, jitter=0.0, loss=0.0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('', port))
+        self.sock.setblocking(False)
+        self.link = LossyLink(self.sock, latency, jitter, loss, seed)
+        self.game = Game(headless=True, render=False, seed=seed, input_source=ScriptedInput(self.buttons))
+        self.snapshot_every = max(1, round(FPS / snapshot_rate))
+        self.clients = {}
+        self.presses = 0
+        self.seq = 0
+        self.history = {}
+        self.full_snapshots = 0
+        self.left_out = 0
+        self.received_bytes = 0
+    
+    def buttons(self, frame, game):
+        """Held buttons for each fighter, with the presses given to all"""
+        buttons = [self.presses & ~INPUT_RESTART] * len(game.fighters)
+        for client in self.clients.values():
+            buttons[client['fighter']] |= client['buttons']
+        self.presses = 0
+        return buttons
+    
+    def join(self, address, now):
+        """Give a new client the lowest free fighter index and a fresh fighter there"""
+        taken = {client['fighter'] for client in self.clients.values()}
+        index = min(set(range(len(self.game.fighters) + 1)) - taken)
+        if index == len(self.game.fighters):
+            self.game.add_fighter()
+        elif self.clients:
+            self.game.add_fighter(index)
+        self.clients[address] = {'buttons': 0, 'input_seq': 0, 'ack': 0, 'fighter': index, 'seen': now}
+    
+    def leave(self, address):
+        """Take a client's fighter out of play, ending the game if it was the last one up"""
+        game = self.game
+        game.fighters[self.clients.pop(address)['fighter']].health = 0
+        if game.all_down() and not game.game_over and self.clients:
+            game.end_game()
+    
+    def unmanned(self):
+        """Take the fighters no client is flying out of play, as after a restart"""
+        taken = {client['fighter'] for client in self.clients.values()}
+        for index, fighter in enumerate(self.game.fighters):
+            if index not in taken:
+                fighter.health = 0
+    
+    def receive(self, now):
+        for data, address in self.link.receive():
+            self.received_bytes += len(data)
+            client = self.clients.get(address)
+            if client is None:
+                if data[0] == NET_BYE or len(self.clients) == self.MAX_CLIENTS:
+                    continue
+                self.join(address, now)
+                client = self.clients[address]
+            client['seen'] = now
+            if data[0] == NET_BYE:
+                self.leave(address)
+            elif data[0] == NET_INPUT and len(data) == NET_INPUT_PACKET.size:
+                _, input_seq, buttons, ack = NET_INPUT_PACKET.unpack(data)
+                if input_seq > client['input_seq']:
+                    client['input_seq'] = input_seq
+                    client['buttons'] = buttons & ~self.PRESSES
+                    self.presses |= buttons & self.PRESSES
+                client['ack'] = max(client['ack'], ack)
+        for address in [address for address, client in self.clients.items() if now - client['seen'] > self.TIMEOUT]:
+            self.leave(address)
+    
+    def broadcast(self, now):
+        info, state = SnapshotCodec.capture(self.game)
+        # What doesn't fit is left out of the history too, so it simply
+        # appears in a later snapshot that has room
+        self.left_out += SnapshotCodec.cap(state)
+        self.seq += 1
+        self.history[self.seq] = state
+        self.history.pop(self.seq - self.HISTORY, None)
+        for address, client in self.clients.items():
+            base = self.history.get(client['ack'])
+            base_seq = client['ack'] if base is not None else 0
+            self.full_snapshots += base is None
+            packet = SnapshotCodec.encode(self.seq, base_seq, client['input_seq'], client['fighter'],
+                                          info, state, base)
+            self.link.send(packet, address, now)
+    
+    def run(self, wait=30.0, log=print):
+        """Serve until every client has left, or none came within wait seconds"""
+        game = self.game
+        self.link.log = log
+        log(f"Serving on UDP port {self.sock.getsockname()[1]}")
+        started = None
+        pacer = Pacer()
+        idle_since = pacer.deadline
+        while True:
+            now = time.perf_counter()
+            self.receive(now)
+            if self.clients:
+                if started is None:
+                    started = now
+                    log("Client connected, starting" + (f" seed {game.seed}" if game.seed is not None else ""))
+                if game.game_over and self.presses & INPUT_RESTART:
+                    game.restart()
+                    self.unmanned()
+                game.step()
+                if game.frame % self.snapshot_every == 0:
+                    self.broadcast(now)
+            elif started is not None or now - idle_since > wait:
+                break
+            self.link.flush(now)
+            pacer.wait()
+        self.sock.close()
+        
+        if started is None:
+            log("No client connected")
+            return
+        elapsed = time.perf_counter() - started
+        log(f"Served {game.frame} frames in {elapsed:.1f} s, {self.seq} snapshots "
+            f"({self.full_snapshots} sent full), wave {game.wave}, score {game.score}")
+        log(f"Sent {self.link.bytes / elapsed:.0f} B/s ({self.link.bytes / max(1, self.link.packets):.0f} B/snapshot, "
+            f"{self.link.dropped} dropped by the link, {sum(self.link.errors.values())} failed), "
+            f"received {self.received_bytes / elapsed:.0f} B/s")
+        if self.left_out:
+            log(f"{self.left_out} records left out of oversized snapshots")
+
+class NetClient:
+    """Sends input to a NetServer and shows its interpolated snapshots
+    
+    Input is sampled and sent every frame. Snapshots are decoded against
+    the state they were delta-encoded from and rendered INTERP_SNAPSHOTS
+    snapshot intervals in the past, blended between the two around that
+    time, by loading them into a local Game that only draws. Headless
+    clients fly WEAVE_SCRIPT and draw nothing, for measuring.
+    """
+    INTERP_SNAPSHOTS = 2
+    HISTORY = 64
+    TIMEOUT = 5.0
+    
+    def __init__(self, host, port=NET_PORT, headless=False, latency=0.0, jitter=0.0, loss=0.0, seed=None, **options):
+        self.server = (socket.gethostbyname(host), port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.link = LossyLink(self.sock, latency, jitter, loss, seed)
+        input_source = ScriptedInput(WEAVE_SCRIPT, loop=True) if headless else KeyboardInput()
+        self.view = Game(headless=headless, render=not headless, input_source=input_source, **options)
+        self.headless = headless
+        self.states = {}  # seq -> state, the bases the server may encode against
+        self.timeline = []  # (frame, seq, info) of decoded snapshots in frame order
+        self.ack = 0
+        self.input_seq = 0
+        self.sent_at = {}
+        self.acked_input = 0
+        self.latencies = []
+        self.render_frame = None
+        self.interval = 2
+        self.snapshots = 0
+        self.undecodable = 0
+        self.first_seq = None
+        self.newest_seq = 0
+        self.you = 0  # Index of the fighter this client flies
+        self.received_bytes = 0
+    
+    def receive(self, now):
+        for data, address in self.link.receive():
+            if address != self.server or data[0] != SnapshotCodec.SNAPSHOT:
+                continue
+            self.received_bytes += len(data)
+            seq, base_seq, input_seq, you, info = SnapshotCodec.header(data)
+            if seq in self.states:
+                continue
+            if base_seq and base_seq not in self.states:
+                self.undecodable += 1
+                continue
+            state = SnapshotCodec.decode(data, self.states.get(base_seq))
+            self.snapshots += 1
+            if self.first_seq is None:
+                self.first_seq = seq
+            self.newest_seq = max(self.newest_seq, seq)
+            self.states[seq] = state
+            self.states.pop(seq - self.HISTORY, None)
+            self.ack = max(self.ack, seq)
+            self.you = you
+            self.last_received = now
+            
+            if input_seq > self.acked_input:
+                for pending in range(self.acked_input + 1, input_seq + 1):
+                    sent = self.sent_at.pop(pending, None)
+                    if pending == input_seq and sent is not None:
+                        self.latencies.append(now - sent)
+                self.acked_input = input_seq
+            
+            frame = info[0]
+            if self.timeline and frame > self.timeline[-1][0]:
+                self.interval = frame - self.timeline[-1][0]
+                self.explode(self.states[self.timeline[-1][1]], state)
+            self.timeline.append((frame, seq, info))
+            self.timeline.sort()
+            del self.timeline[:-self.HISTORY // 2]
+    
+    def explode(self, old, new):
+        """Explosions for enemies gone between two snapshots, as the server made them"""
+        q = SnapshotCodec.QUANTUM
+        for key, (kind, x, y) in old['enemies'].items():
+            if key not in new['enemies'] and y < SCREEN_HEIGHT * q:
+                width, height = Enemy.SIZES[ENEMY_TYPES[kind]]
+                self.view.create_explosion(x / q + width // 2, y / q + height // 2)
+    
+    def show(self, frames):
+        """Advance the render clock by frames and load the view with the state at it"""
+        newest = self.timeline[-1][0]
+        target = newest - self.INTERP_SNAPSHOTS * self.interval
+        if self.render_frame is None or abs(target - self.render_frame) > FPS // 2:
+            self.render_frame = target
+        else:
+            # Ease towards the target so arrival jitter doesn't show
+            self.render_frame += frames + (target - self.render_frame) * 0.05
+        
+        timeline = self.timeline
+        index = len(timeline) - 1
+        while index > 0 and timeline[index - 1][0] > self.render_frame:
+            index -= 1
+        frame, seq, info = timeline[index]
+        state = self.states[seq]
+        if index > 0 and frame > self.render_frame:
+            before, before_seq, _ = timeline[index - 1]
+            t = max(0.0, (self.render_frame - before) / (frame - before))
+            state = SnapshotCodec.blend(self.states[before_seq], state, t)
+        SnapshotCodec.show(self.view, info, state, self.you)
+    
+    def run(self, frames=None, log=print):
+        """Play until quit, the server goes quiet or after frames frames"""
+        view = self.view
+        self.link.log = log
+        self.last_received = time.perf_counter()
+        self.link.send(bytes([NET_HELLO]), self.server, self.last_received)
+        started = time.perf_counter()
+        pacer = Pacer()
+        played = 0
+        while view.running and played != frames:
+            now = time.perf_counter()
+            if not self.headless:
+                for event in pygame.event.get():
+                    view.handle_event(event)
+            
+            # The server restarts the game; the view only passes the press on
+            buttons = view.input_source.poll(view) | (INPUT_RESTART if view.restart_pressed else 0)
+            view.restart_pressed = False
+            self.input_seq += 1
+            self.sent_at[self.input_seq] = now
+            self.link.send(NET_INPUT_PACKET.pack(NET_INPUT, self.input_seq, buttons, self.ack), self.server, now)
+            self.receive(now)
+            self.link.flush(now)
+            if now - self.last_received > self.TIMEOUT:
+                log("Server stopped responding")
+                break
+            
+            if self.timeline:
+                self.show(1)
+                view.starfield.update()
+                view.particles.update()
+                if not self.headless:
+                    view.draw()
+            played += 1
+            pacer.wait()
+        
+        now = time.perf_counter()
+        self.link.send(bytes([NET_BYE]), self.server, now)
+        self.link.flush(now + self.link.latency + self.link.jitter)
+        self.sock.close()
+        self.report(now - started, log)
+        if not self.headless:
+            pygame.quit()
+    
+    def report(self, elapsed, log=print):
+        log(f"{self.snapshots} snapshots in {elapsed:.1f} s ({self.snapshots / elapsed:.1f}/s), "
+            f"{self.newest_seq - (self.first_seq or 1) + 1 - self.snapshots - self.undecodable} lost, {self.undecodable} undecodable")
+        log(f"Received {self.received_bytes / elapsed:.0f} B/s, sent {self.link.bytes / elapsed:.0f} B/s"
+            + (f", {sum(self.link.errors.values())} sends failed" if self.link.errors else ""))
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            log(f"Input to snapshot latency: mean {1000 * sum(latencies) / len(latencies):.1f} ms, "
+                f"p95 {1000 * latencies[int(0.95 * (len(latencies) - 1))]:.1f} ms, "
+                f"plus {1000 * self.INTERP_SNAPSHOTS * self.interval / FPS:.0f} ms interpolation delay")
+
+class Benchmark:
+    """Stress scenarios timing each phase of the game loop
+    
+    Every scenario builds a headless, rendering game from the regular
+    classes and tops its population back up before each frame (untimed).
+    Per-phase times are reported as mean/p95/p99 milliseconds, with
+    update excluding the check_collisions call it makes. A second,
+    shorter pass under tracemalloc measures memory allocated per frame.
+    """
+    PHASES = ('update', 'check_collisions', 'draw')
+    NOISE_FLOOR_MS = 0.05  # Smaller slowdowns never count as regressions
+    
+    def __init__(self, frames=300, alloc_frames=30, seed=0):
+        self.frames = frames
+        self.alloc_frames = alloc_frames
+        self.seed = seed
+    
+    # Scenarios: name -> (Game keyword arguments, setup, per-frame top-up)
+    @staticmethod
+    def keep_alive(game):
+        game.fighter.health = game.fighter.max_health
+        game.game_over = False
+    
+    @staticmethod
+    def fill_enemies(game, count, enemy_type=None):
+        while len(game.enemies) < count:
+            kind = enemy_type or game.rng.choice(['basic', 'fast', 'tank'])
+            enemy = Enemy(game.rng.randint(0, SCREEN_WIDTH - 20), game.rng.randint(-20, SCREEN_HEIGHT - 100),
+                          kind, game.enemy_bullets, game.rng)
+            game.enemies.append(enemy)
+    
+    @staticmethod
+    def fill_bullets(game, count):
+        # Enemy bullets get no owner so kills never sweep them away
+        for store, dy, owner in ((game.fighter.bullets, -8, PLAYER_OWNER), (game.enemy_bullets, 6, -1)):
+            for _ in range(count // 2 - len(store)):
+                Bullet.fire(store, game.rng.uniform(0, SCREEN_WIDTH), game.rng.uniform(0, SCREEN_HEIGHT),
+                            game.rng.uniform(-2, 2), dy, owner)
+    
+    @staticmethod
+    def fill_particles(game, count):
+        while len(game.particles) < count:
+            game.create_explosion(game.rng.uniform(0, SCREEN_WIDTH), game.rng.uniform(0, SCREEN_HEIGHT))
+    
+    @staticmethod
+    def setup_wave(game, wave):
+        game.wave = wave
+        game.enemies_per_wave = game.difficulty.wave_size(wave)
+    
+    def scenarios(self):
+        return {
+            'wave_1': ({}, lambda game: None, self.keep_alive),
+            'wave_50': ({}, lambda game: self.setup_wave(game, 50), self.keep_alive),
+            'enemies_500': ({}, lambda game: None,
+                            lambda game: (self.keep_alive(game), self.fill_enemies(game, 500))),
+            'bullets_10k': ({}, lambda game: None,
+                            lambda game: (self.keep_alive(game), self.fill_bullets(game, 10000))),
+            'particles_5k': ({'particle_cap': 8192}, lambda game: None,
+                             lambda game: (self.keep_alive(game), self.fill_particles(game, 5000))),
+            'tank_volleys': ({}, lambda game: None,
+                             lambda game: (self.keep_alive(game), self.fill_enemies(game, 80, 'tank'),
+                                           game.enemies.shoot_delay.fill(4))),
+            'mixed_late_wave': ({'particle_cap': 4096}, lambda game: self.setup_wave(game, 50),
+                                lambda game: (self.keep_alive(game), self.fill_enemies(game, 200),
+                                              self.fill_bullets(game, 3000), self.fill_particles(game, 2000)))
+        }
+    
+    def make_game(self, name, **options):
+        kwargs, setup, feed = self.scenarios()[name]
+        kwargs = dict(kwargs, **options)
+        game = Game(headless=kwargs.pop('headless', True), render=kwargs.pop('render', True), seed=self.seed,
+                    input_source=ScriptedInput(WEAVE_SCRIPT, loop=True), **kwargs)
+        setup(game)
+        return game, feed
+    
+    def run_scenario(self, name):
+        game, feed = self.make_game(name)
+        timings = {phase: [] for phase in self.PHASES}
+        check_collisions = game.check_collisions
+        
+        def timed_check_collisions():
+            start = time.perf_counter()
+            check_collisions()
+            timings['check_collisions'].append(time.perf_counter() - start)
+        game.check_collisions = timed_check_collisions
+        
+        perf_counter = time.perf_counter
+        for _ in range(self.frames):
+            feed(game)
+            start = perf_counter()
+            game.step()
+            middle = perf_counter()
+            game.draw()
+            end = perf_counter()
+            timings['update'].append(middle - start - timings['check_collisions'][-1])
+            timings['draw'].append(end - middle)
+        
+        result = {}
+        for phase, samples in timings.items():
+            ms = np.array(samples) * 1000
+            result[phase] = {
+                'mean_ms': round(float(ms.mean()), 4),
+                'p95_ms': round(float(np.percentile(ms, 95)), 4),
+                'p99_ms': round(float(np.percentile(ms, 99)), 4)
+            }
+        result['entities'] = {
+            'enemies': len(game.enemies),
+            'bullets': len(game.fighter.bullets) + len(game.enemy_bullets),
+            'particles': len(game.particles)
+        }
+        result['alloc_kib_per_frame'] = self.measure_allocations(game, feed)
+        return result
+    
+    def measure_allocations(self, game, feed):
+        """Mean peak memory allocated within one frame, in KiB"""
+        import tracemalloc
+        tracemalloc.start()
+        peaks = []
+        for _ in range(self.alloc_frames):
+            feed(game)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            game.step()
+            game.draw()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        return round(sum(peaks) / len(peaks) / 1024, 2)
+    
+    def run(self, names=None, log=print):
+        results = {
+            'meta': {
+                'frames': self.frames,
+                'seed': self.seed,
+                'python': sys.version.split()[0],
+                'pygame': pygame.version.ver,
+                'numpy': np.__version__
+            },
+            'scenarios': {}
+        }
+        for name in names or self.scenarios():
+            result = results['scenarios'][name] = self.run_scenario(name)
+            log(f"{name:16} " + "  ".join(
+                f"{phase} {result[phase]['mean_ms']:.2f}/{result[phase]['p95_ms']:.2f}/{result[phase]['p99_ms']:.2f}"
+                for phase in self.PHASES) + f"  alloc {result['alloc_kib_per_frame']:.0f} KiB")
+        return results
+    
+    def pipeline(self, name='mixed_late_wave', log=print):
+        """Throughput of the single-threaded loop against the pipelined one
+        
+        Both play scenario name flat out in a window for frames steps: one
+        thread stepping, drawing and flipping in turn, against a simulation
+        thread publishing DrawStates while this one renders the newest.
+        """
+        game, feed = self.make_game(name, headless=False, render_fps=0)
+        start = time.perf_counter()
+        for _ in range(self.frames):
+            feed(game)
+            game.step()
+            game.draw()
+        single = self.frames / (time.perf_counter() - start)
+        
+        game, feed = self.make_game(name, headless=False, render_fps=0, pipeline=True)
+        buffer = TripleBuffer(DrawState(game, copy=True))
+        
+        def simulate():
+            for _ in range(self.frames):
+                feed(game)
+                game.step()
+                buffer.publish(DrawState(game, copy=True))
+        simulation = threading.Thread(target=simulate, name='simulation')
+        rendered = 0
+        shown = game.frame
+        start = time.perf_counter()
+        simulation.start()
+        while simulation.is_alive():
+            state, fresh = buffer.latest(timeout=0.1)
+            if fresh:
+                game.starfield.update(state.frame - shown)
+                shown = state.frame
+                game.render(state)
+                rendered += 1
+        elapsed = time.perf_counter() - start
+        simulation.join()
+        pygame.quit()
+        
+        result = {
+            'scenario': name,
+            'frames': self.frames,
+            'single_thread_fps': round(single, 1),
+            'pipelined_steps_per_s': round(self.frames / elapsed, 1),
+            'pipelined_fps': round(rendered / elapsed, 1),
+            'states_dropped': buffer.dropped,
+            'cpus': os.cpu_count()
+        }
+        log(f"{name}: single-threaded {single:.0f} steps+frames/s; pipelined {self.frames / elapsed:.0f} steps/s "
+            f"and {rendered / elapsed:.0f} frames/s ({buffer.dropped} states never shown) on {os.cpu_count()} CPUs")
+        return result
+    
+    def palette(self, name='wave_1', log=print):
+        """Time drawing and presenting scenario name in a window, direct
+        32-bit against the paletted canvas at window scales 1 and 2"""
+        result = {'scenario': name, 'frames': self.frames}
+        perf_counter = time.perf_counter
+        for mode, options in (('direct', {}), ('palette', {'palette': 'cyan_magenta'}),
+                              ('palette_x2', {'palette': 'cyan_magenta', 'scale': 2})):
+            game, feed = self.make_game(name, headless=False, render_fps=0, **options)
+            samples = []
+            for _ in range(self.frames):
+                feed(game)
+                game.step()
+                start = perf_counter()
+                game.draw()
+                samples.append(perf_counter() - start)
+            ms = np.array(samples) * 1000
+            result[mode] = {'mean_ms': round(float(ms.mean()), 4), 'p99_ms': round(float(np.percentile(ms, 99)), 4)}
+        pygame.quit()
+        log(f"{name}: draw and present " + "  ".join(
+            f"{mode} {result[mode]['mean_ms']:.3f}/{result[mode]['p99_ms']:.3f}"
+            for mode in ('direct', 'palette', 'palette_x2')) + " ms (mean/p99)")
+        return result
+    
+    def savestates(self, name='mixed_late_wave', log=print):
+        """Time SaveState capture and restore of scenario name after each step"""
+        game, feed = self.make_game(name, render=False)
+        captures, restores, sizes = [], [], []
+        perf_counter = time.perf_counter
+        for _ in range(self.frames):
+            feed(game)
+            game.step()
+            start = perf_counter()
+            data = SaveState.capture(game)
+            middle = perf_counter()
+            SaveState.restore(game, data)
+            captures.append(middle - start)
+            restores.append(perf_counter() - middle)
+            sizes.append(len(data))
+        
+        result = {'scenario': name, 'frames': self.frames, 'kib': round(sum(sizes) / len(sizes) / 1024, 1)}
+        for phase, samples in (('capture', captures), ('restore', restores)):
+            ms = np.array(samples) * 1000
+            result[phase] = {'mean_ms': round(float(ms.mean()), 4), 'p99_ms': round(float(np.percentile(ms, 99)), 4)}
+        log(f"{name}: {result['kib']:.0f} KiB, capture {result['capture']['mean_ms']:.3f}/{result['capture']['p99_ms']:.3f} "
+            f"restore {result['restore']['mean_ms']:.3f}/{result['restore']['p99_ms']:.3f} ms (mean/p99)")
+        return result
+    
+    def autopilot(self, name='tank_volleys', log=print):
+        """Time Autopilot.poll on scenario name after each step"""
+        game, feed = self.make_game(name, render=False)
+        pilot = Autopilot()
+        samples = []
+        perf_counter = time.perf_counter
+        for _ in range(self.frames):
+            feed(game)
+            game.step()
+            start = perf_counter()
+            pilot.poll(game)
+            samples.append(perf_counter() - start)
+        
+        ms = np.array(samples) * 1000
+        result = {'scenario': name, 'frames': self.frames, 'threats': len(game.enemies) + len(game.enemy_bullets),
+                  'mean_ms': round(float(ms.mean()), 4), 'p99_ms': round(float(np.percentile(ms, 99)), 4)}
+        log(f"{name}: autopilot {result['mean_ms']:.3f}/{result['p99_ms']:.3f} ms (mean/p99) "
+            f"with {result['threats']} enemies and enemy bullets")
+        return result
+    
+    @classmethod
+    def regressions(cls, results, baseline, tolerance):
+        """Phase stats that got slower than baseline by more than tolerance"""
+        found = []
+        for name, result in results['scenarios'].items():
+            base = baseline.get('scenarios', {}).get(name)
+            if base is None:
+                continue
+            for phase in cls.PHASES:
+                for stat in ('mean_ms', 'p95_ms'):
+                    new, old = result[phase][stat], base[phase][stat]
+                    if new > old * (1 + tolerance) and new - old > cls.NOISE_FLOOR_MS:
+                        found.append(f"{name} {phase} {stat}: {old:.3f} -> {new:.3f}")
+        return found
+
+class BalanceSweep:
+    """Batch of display-less games played by pilot_policy for difficulty tuning
+    
+    Every combination of the swept Difficulty values is played from seeds
+    seed .. seed + runs - 1, so a report is reproducible from its settings.
+    Trials share nothing and go to a process pool in chunks, so throughput
+    grows with the number of workers.
+    """
+    STATS = ('score', 'damage', 'frames')
+    
+    def __init__(self, sweep=None, runs=100, frames=18000, seed=0, workers=None, step_frames=1):
+        self.sweep = sweep or {}  # Difficulty parameter -> values to try
+        self.runs = runs
+        self.frames = frames
+        self.seed = seed
+        self.workers = workers
+        self.step_frames = step_frames
+    
+    def configs(self):
+        names = list(self.sweep)
+        return [dict(zip(names, values)) for values in itertools.product(*self.sweep.values())]
+    
+    @staticmethod
+    def run_trial(trial):
+        params, seed, frames, step_frames = trial
+        game = Game(headless=True, render=False, seed=seed, difficulty=Difficulty(**params),
+                    input_source=ScriptedInput(pilot_policy), step_frames=step_frames)
+        played = game.simulate(frames)
+        return game.wave, game.score, game.damage_taken, played, game.game_over
+    
+    @classmethod
+    def summarize(cls, outcomes):
+        waves, score, damage, frames, died = np.array(outcomes, dtype=np.int64).T
+        summary = {
+            'runs': len(outcomes),
+            'died': round(float(died.mean()), 4),
+            # Share of runs that reached each wave, starting at wave 1
+            'survival_by_wave': [round(float((waves >= wave).mean()), 4) for wave in range(1, waves.max() + 1)]
+        }
+        for stat, values in zip(cls.STATS, (score, damage, frames)):
+            p10, p50, p90 = np.percentile(values, (10, 50, 90)).tolist()
+            summary[stat] = {'mean': round(float(values.mean()), 2), 'p10': p10, 'p50': p50,
+                             'p90': p90, 'max': int(values.max())}
+        return summary
+    
+    def run(self, log=print):
+        import multiprocessing
+        configs = self.configs()
+        trials = [(params, self.seed + run, self.frames, self.step_frames)
+                  for params in configs for run in range(self.runs)]
+        workers = self.workers or multiprocessing.cpu_count()
+        
+        start = time.perf_counter()
+        if workers == 1:
+            outcomes = list(map(self.run_trial, trials))
+        else:
+            # Workers are joined, not terminated: SDL turns SIGTERM into a quit
+            # event, so a terminated worker that ran pygame.init never exits
+            pool = multiprocessing.Pool(workers)
+            outcomes = pool.map(self.run_trial, trials, chunksize=max(1, len(trials) // (workers * 8)))
+            pool.close()
+            pool.join()
+        elapsed = time.perf_counter() - start
+        
+        report = {
+            'meta': {
+                'runs': self.runs,
+                'frames': self.frames,
+                'step_frames': self.step_frames,
+                'seed': self.seed,
+                'workers': workers,
+                'elapsed_s': round(elapsed, 2),
+                'sweep': self.sweep
+            },
+            'configs': []
+        }
+        for index, params in enumerate(configs):
+            summary = self.summarize(outcomes[index * self.runs:(index + 1) * self.runs])
+            report['configs'].append({'params': params, **summary})
+            survival = " ".join(f"{share:.2f}" for share in summary['survival_by_wave'][1:8])
+            log(f"{' '.join(f'{name}={value}' for name, value in params.items()) or 'defaults':40} "
+                f"score {summary['score']['p50']:.0f}  damage {summary['damage']['p50']:.0f}  "
+                f"died {summary['died']:.2f}  waves 2+ {survival}")
+        log(f"{len(trials)} games in {elapsed:.1f}s on {workers} workers")
+        return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CGA Fighter Jet - Enhanced Edition")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="only redraw and present the screen regions that changed")
+    parser.add_argument('--fps', type=int, default=FPS,
+                        help="render frame rate cap, e.g. 120 or 144 (0 for uncapped); "
+                             "game speed does not change")
+    parser.add_argument('--palette', nargs='?', const='cyan_magenta', choices=list(CGA_PALETTES),
+                        help="render into an 8-bit paletted frame (F2 cycles palettes)")
+    parser.add_argument('--backend', choices=('surface', 'texture'), default='surface',
+                        help="draw on Surfaces and flip, or copy textures with an SDL Renderer")
+    parser.add_argument('--software-renderer', action='store_true',
+                        help="use SDL's software renderer for --backend texture")
+    parser.add_argument('--scale', type=int, default=1,
+                        help="integer window scale for --palette or --backend texture")
+    parser.add_argument('--profile', action='store_true',
+                        help="record phase timings and show the overlay (F3 toggles it)")
+    parser.add_argument('--profile-csv', metavar='CSV',
+                        help="record phase timings and write the last frames to this file on exit")
+    parser.add_argument('--headless', action='store_true',
+                        help="simulate without a window and print a summary")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="open the window, draw the first frame, print how long that took and exit")
+    parser.add_argument('--frames', type=int, default=3600,
+                        help="frames to simulate in headless mode")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for all game randomness")
+    parser.add_argument('--render', action='store_true',
+                        help="draw each headless frame to an off-screen surface")
+    parser.add_argument('--record', metavar='REPLAY',
+                        help="record the seed and every frame's input to this file")
+    parser.add_argument('--replay', metavar='REPLAY',
+                        help="play back a recording in real time, or at full speed with --headless")
+    parser.add_argument('--replay-until', type=int, default=None, metavar='FRAME',
+                        help="stop playback at this frame (default: end of the recording)")
+    parser.add_argument('--bench', nargs='*', metavar='SCENARIO',
+                        help="run the stress benchmark (all scenarios if none are named)")
+    parser.add_argument('--bench-frames', type=int, default=300,
+                        help="timed frames per benchmark scenario")
+    parser.add_argument('--bench-output', metavar='JSON',
+                        help="write benchmark results to this file")
+    parser.add_argument('--bench-baseline', metavar='JSON',
+                        help="fail if any phase is slower than these stored results")
+    parser.add_argument('--bench-tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument('--step-frames', type=int, default=1, metavar='N',
+                        help="frames per simulation step for --headless and --balance; "
+                             "collisions are swept, so 4-8 stays accurate")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="simulate on a separate thread from rendering")
+    parser.add_argument('--autopilot', action='store_true',
+                        help="let a bot that dodges predicted bullet paths fly the fighter, for soak runs")
+    parser.add_argument('--bench-autopilot', nargs='?', const='tank_volleys', metavar='SCENARIO',
+                        help="time the autopilot's per-step planning on a scenario")
+    parser.add_argument('--capture', metavar='DIR',
+                        help="write every presented frame to DIR, dropping frames the workers can't keep up with")
+    parser.add_argument('--capture-format', choices=FrameCapture.FORMATS, default='png',
+                        help="PNG images or raw 2-bit CGA-indexed frames (4 pixels per byte)")
+    parser.add_argument('--rewind', type=float, default=0, metavar='SECONDS',
+                        help="keep save states of the last SECONDS of play; Backspace rewinds one second")
+    parser.add_argument('--bench-savestate', nargs='?', const='mixed_late_wave', metavar='SCENARIO',
+                        help="time save state capture and restore on a scenario")
+    parser.add_argument('--bench-palette', nargs='?', const='wave_1', metavar='SCENARIO',
+                        help="compare drawing and presenting with and without --palette on a scenario")
+    parser.add_argument('--bench-pipeline', nargs='?', const='mixed_late_wave', metavar='SCENARIO',
+                        help="compare single-threaded and --pipeline throughput on a scenario, flat out")
+    parser.add_argument('--balance', action='store_true',
+                        help="play batches of headless games with a scripted pilot and report "
+                             "survival, score and damage for each difficulty setting")
+    parser.add_argument('--sweep', action='append', default=[], metavar='PARAM=V1,V2',
+                        help="difficulty values to try in --balance runs (repeatable): "
+                             + ", ".join(Difficulty.DEFAULTS))
+    parser.add_argument('--balance-runs', type=int, default=100,
+                        help="games per difficulty setting")
+    parser.add_argument('--balance-frames', type=int, default=18000,
+                        help="frame limit per game")
+    parser.add_argument('--balance-output', metavar='JSON',
+                        help="write the balancing report to this file")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes for --balance (default: one per core) "
+                             "and --capture (default: one per core but one)")
+    parser.add_argument('--quality', default='auto', metavar='LEVEL',
+                        help=f"visual quality from 0 (full) to {len(QualityGovernor.LEVELS) - 1}, "
+                             f"or auto to lower it while frames run over budget (default)")
+    parser.add_argument('--event-log', metavar='PATH',
+                        help=f"append game events to PATH, which also keeps the high score "
+                             f"(default for windowed keyboard play: {EVENT_LOG_PATH})")
+    parser.add_argument('--serve', action='store_true',
+                        help="run an authoritative game server for --connect clients")
+    parser.add_argument('--connect', metavar='HOST',
+                        help="play on the server at HOST (headless: scripted, for measuring)")
+    parser.add_argument('--port', type=int, default=NET_PORT,
+                        help="UDP port of the server")
+    parser.add_argument('--snapshot-rate', type=int, default=30, metavar='HZ',
+                        help="server snapshots per second")
+    parser.add_argument('--net-latency', type=float, default=0, metavar='MS',
+                        help="simulated one-way latency added to every packet sent")
+    parser.add_argument('--net-jitter', type=float, default=0, metavar='MS',
+                        help="simulated extra random delay, up to MS")
+    parser.add_argument('--net-loss', type=float, default=0, metavar='FRACTION',
+                        help="simulated fraction of packets sent that are lost")
+    args = parser.parse_args()
+    if args.quality != 'auto':
+        if not args.quality.isdigit() or int(args.quality) >= len(QualityGovernor.LEVELS):
+            parser.error(f"bad --quality {args.quality!r}")
+        args.quality = int(args.quality)
+    if args.backend == 'texture' and (args.palette or args.dirty_rects or args.capture):
+        parser.error("--palette, --dirty-rects and --capture need --backend surface")
+    if args.step_frames < 1 or (args.step_frames > 1 and (args.record or args.replay)):
+        parser.error("--step-frames must be at least 1, and 1 when recording or replaying")
+    if args.autopilot and args.replay:
+        parser.error("--autopilot and --replay both supply the input")
+    if args.replay_until is not None and args.replay_until < 0:
+        parser.error("--replay-until must not be negative")
+    if args.rewind < 0 or (args.rewind and (args.record or args.replay)):
+        parser.error("--rewind must not be negative, and is unavailable when recording or replaying")
+    
+    # Playback replaces the seed and the input source with the recorded ones
+    input_source = Autopilot() if args.autopilot else None
+    if args.replay:
+        args.seed, replay = InputRecorder.load(args.replay)
+        input_source = ScriptedInput(replay)
+        args.frames = min(len(replay), len(replay) if args.replay_until is None else args.replay_until)
+    
+    if args.balance:
+        sweep = {}
+        for option in args.sweep:
+            name, _, values = option.partition('=')
+            if name not in Difficulty.DEFAULTS or not values:
+                parser.error(f"bad --sweep {option!r}")
+            kind = type(Difficulty.DEFAULTS[name])
+            sweep[name] = [kind(value) for value in values.split(',')]
+        report = BalanceSweep(sweep, runs=args.balance_runs, frames=args.balance_frames,
+                              seed=args.seed or 0, workers=args.workers, step_frames=args.step_frames).run()
+        if args.balance_output:
+            with open(args.balance_output, 'w') as f:
+                json.dump(report, f, indent=2)
+    elif args.bench_autopilot:
+        bench = Benchmark(frames=args.bench_frames, seed=args.seed or 0)
+        if args.bench_autopilot not in bench.scenarios():
+            parser.error(f"unknown scenario {args.bench_autopilot!r}")
+        bench.autopilot(args.bench_autopilot)
+    elif args.bench_savestate:
+        bench = Benchmark(frames=args.bench_frames, seed=args.seed or 0)
+        if args.bench_savestate not in bench.scenarios():
+            parser.error(f"unknown scenario {args.bench_savestate!r}")
+        bench.savestates(args.bench_savestate)
+    elif args.bench_palette:
+        bench = Benchmark(frames=args.bench_frames, seed=args.seed or 0)
+        if args.bench_palette not in bench.scenarios():
+            parser.error(f"unknown scenario {args.bench_palette!r}")
+        bench.palette(args.bench_palette)
+    elif args.bench_pipeline:
+        bench = Benchmark(frames=args.bench_frames, seed=args.seed or 0)
+        if args.bench_pipeline not in bench.scenarios():
+            parser.error(f"unknown scenario {args.bench_pipeline!r}")
+        bench.pipeline(args.bench_pipeline)
+    elif args.bench is not None:
+        bench = Benchmark(frames=args.bench_frames, seed=args.seed or 0)
+        unknown = set(args.bench) - set(bench.scenarios())
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        results = bench.run(args.bench)
+        if args.bench_output:
+            with open(args.bench_output, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.bench_baseline:
+            with open(args.bench_baseline) as f:
+                regressions = Benchmark.regressions(results, json.load(f), args.bench_tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                sys.exit(1)
+    elif args.serve or args.connect:
+        link = dict(latency=args.net_latency / 1000, jitter=args.net_jitter / 1000, loss=args.net_loss)
+        if args.serve:
+            NetServer(port=args.port, seed=args.seed, snapshot_rate=args.snapshot_rate, **link).run()
+        elif args.headless:
+            NetClient(args.connect, args.port, headless=True, **link).run(frames=args.frames)
+        else:
+            NetClient(args.connect, args.port, dirty_rects=args.dirty_rects, palette=args.palette,
+                      scale=args.scale, **link).run()
+    elif args.startup_time:
+        start = time.perf_counter()
+        game = Game(dirty_rects=args.dirty_rects, seed=args.seed, palette=args.palette, scale=args.scale)
+        created = time.perf_counter()
+        game.draw()
+        shown = time.perf_counter()
+        print(f"imports {(IMPORTED - STARTED) * 1000:.1f} ms, Game() {(created - start) * 1000:.1f} ms, "
+              f"first frame {(shown - created) * 1000:.1f} ms, total {(shown - STARTED) * 1000:.1f} ms")
+        pygame.quit()
+    elif args.headless:
+        game = Game(headless=True, render=args.render or bool(args.capture), seed=args.seed,
+                    input_source=input_source or ScriptedInput(WEAVE_SCRIPT, loop=True),
+                    profile=args.profile, profile_csv=args.profile_csv, record=args.record,
+                    palette=args.palette, event_log=args.event_log,
+                    quality=0 if args.quality == 'auto' else args.quality, step_frames=args.step_frames,
+                    capture=args.capture, capture_format=args.capture_format, capture_workers=args.workers)
+        start = time.perf_counter()
+        frames = game.simulate(args.frames)
+        elapsed = time.perf_counter() - start
+        if game.recorder:
+            game.recorder.close()
+        game.events.close()
+        print(f"{frames} frames in {elapsed:.2f}s ({frames / elapsed:.0f} FPS): "
+              f"wave {game.wave}, score {game.score}, health {game.fighter.health}")
+        if game.capture is not None:
+            game.capture.close()
+        if args.profile_csv:
+            game.profiler.write_csv(args.profile_csv)
+    else:
+        # Only games played from the keyboard log by default, so replays
+        # and autopilot soak runs leave the player's high score alone
+        event_log = args.event_log or (EVENT_LOG_PATH if input_source is None else None)
+        game = Game(dirty_rects=args.dirty_rects, seed=args.seed, render_fps=args.fps,
+                    input_source=input_source, profile=args.profile, profile_csv=args.profile_csv,
+                    record=args.record, palette=args.palette, scale=args.scale,
+                    event_log=event_log, quality=args.quality,
+                    pipeline=args.pipeline, backend=args.backend, software_renderer=args.software_renderer,
+                    rewind_seconds=args.rewind, capture=args.capture, capture_format=args.capture_format,
+                    capture_workers=args.workers)
+        if args.replay:
+            game.run(frames=args.frames, stop_on_game_over=True)
+        else:
+            game.run()
+
+
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+
+import pytest
+
+GAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Retro Aerial Combat Game.py')
+
+
+@pytest.fixture(scope='session')
+def arcade():
+    """The game script loaded as a module, with SDL kept off the display"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    spec = importlib.util.spec_from_file_location('retro_aerial_combat', GAME)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
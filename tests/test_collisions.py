@@ -0,0 +1,47 @@
+import pytest
+
+
+def outcomes(game, steps, feed=None):
+    """Score, kills, damage, health and live counts after every step"""
+    trace = []
+    for _ in range(steps):
+        if feed:
+            feed(game)
+        game.step()
+        trace.append((game.score, game.wave, game.enemies_killed_this_wave, game.damage_taken,
+                      game.fighter.health, len(game.enemies), len(game.enemy_bullets), len(game.fighter.bullets)))
+    return trace
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_grid_matches_brute_force(arcade, seed):
+    traces = []
+    for broadphase in ('grid', 'brute'):
+        game = arcade.Game(headless=True, render=False, seed=seed, broadphase=broadphase,
+                           input_source=arcade.ScriptedInput(arcade.pilot_policy))
+        traces.append(outcomes(game, 600))
+    assert traces[0] == traces[1]
+    assert traces[0][-1][0] > 0
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_grid_matches_brute_force_crowded(arcade, seed):
+    traces = []
+    for broadphase in ('grid', 'brute'):
+        game, feed = arcade.Benchmark(seed=seed).make_game('mixed_late_wave', render=False, broadphase=broadphase)
+        traces.append(outcomes(game, 40, feed))
+    assert traces[0] == traces[1]
+    first, last = traces[0][0], traces[0][-1]
+    assert last[0] > first[0] and last[3] > first[3]  # Hits landed both ways
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_swept_grid_matches_every_pair(arcade, seed):
+    traces = []
+    for broadphase in ('grid', 'brute'):
+        game, feed = arcade.Benchmark(seed=seed).make_game('mixed_late_wave', render=False,
+                                                           broadphase=broadphase, step_frames=4)
+        traces.append(outcomes(game, 60, feed))
+    assert traces[0] == traces[1]
+    first, last = traces[0][0], traces[0][-1]
+    assert last[0] > first[0] and last[3] > first[3]  # Hits landed both ways
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+GAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Retro Aerial Combat Game.py')
+
+
+def play(*args, cwd):
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+    return subprocess.run([sys.executable, GAME, *args], cwd=cwd, env=env, timeout=60,
+                          capture_output=True, text=True)
+
+
+def test_pipelined_profile_writes_csv(tmp_path):
+    replay = tmp_path / 'short.rep'
+    csv = tmp_path / 'profile.csv'
+    recorded = play('--headless', '--frames', '60', '--record', str(replay), cwd=tmp_path)
+    assert recorded.returncode == 0, recorded.stderr
+
+    played = play('--pipeline', '--replay', str(replay), '--profile-csv', str(csv), cwd=tmp_path)
+    assert played.returncode == 0, played.stderr
+    header, *rows = csv.read_text().splitlines()
+    assert header.startswith('frame,events_ms,')
+    assert rows
+    assert all(float(row.split(',')[11]) > 0 for row in rows)  # frame_ms
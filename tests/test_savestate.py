@@ -0,0 +1,27 @@
+def busy_game(arcade, frames=900, **options):
+    """A scripted game played far enough to have enemies, bullets and particles about"""
+    game = arcade.Game(headless=True, render=False, seed=5,
+                       input_source=arcade.ScriptedInput(arcade.pilot_policy), **options)
+    game.simulate(frames)
+    assert len(game.enemies) and len(game.fighter.bullets) and not game.game_over
+    return game
+
+
+def test_restore_then_replay_is_identical(arcade):
+    game = busy_game(arcade)
+    start = arcade.SaveState.capture(game)
+    game.simulate(120)
+    end = arcade.SaveState.capture(game)
+    
+    arcade.SaveState.restore(game, start)
+    assert arcade.SaveState.capture(game) == start
+    game.input_source.frame -= 120
+    game.simulate(120)
+    assert arcade.SaveState.capture(game) == end
+
+
+def test_resimulate_is_identical(arcade):
+    game = busy_game(arcade, rewind_seconds=3)
+    end = arcade.SaveState.capture(game)
+    game.rollback.resimulate(game, 120)
+    assert arcade.SaveState.capture(game) == end
@@ -0,0 +1,34 @@
+import random
+
+
+class AlwaysLow(random.Random):
+    """Random source whose random() is always 0, so every ready enemy fires
+    and every power-up roll succeeds"""
+    def random(self):
+        return 0.0
+
+
+def count_events(arcade, monkeypatch, step_frames, frames=3600):
+    counts = {'fire': 0, 'enemy': 0, 'power_up': 0}
+    
+    def counted(name, method):
+        def wrapper(self):
+            counts[name] += 1
+            method(self)
+        return wrapper
+    
+    monkeypatch.setattr(arcade.Enemy, 'shoot', counted('fire', arcade.Enemy.shoot))
+    monkeypatch.setattr(arcade.Game, 'spawn_enemy', counted('enemy', arcade.Game.spawn_enemy))
+    monkeypatch.setattr(arcade.Game, 'spawn_powerup', counted('power_up', arcade.Game.spawn_powerup))
+    game = arcade.Game(headless=True, render=False, seed=1, step_frames=step_frames,
+                       difficulty=arcade.Difficulty(bullet_damage=0, collision_damage=0))
+    game.rng = AlwaysLow(1)
+    game.simulate(frames)
+    monkeypatch.undo()
+    return counts
+
+
+def test_multi_frame_steps_keep_fire_and_spawn_rates(arcade, monkeypatch):
+    single = count_events(arcade, monkeypatch, 1)
+    assert single['fire'] and single['enemy'] and single['power_up']
+    assert count_events(arcade, monkeypatch, 4) == single